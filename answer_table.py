@@ -0,0 +1,276 @@
+"""Precomputed answers for the most frequent questions.
+
+Build the table from a request log (JSON lines with a "question" field,
+or one question per line), answering each question through the normal
+search path in both languages:
+
+    python answer_table.py build --log requests.log --top 100
+"""
+import argparse
+import difflib
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+try:
+    import fcntl
+except ImportError:  # No advisory locks on Windows; every process refreshes
+    fcntl = None
+
+from law_classifier import PUNCTUATION_TABLE
+from law_index import STOPWORDS
+
+ANSWERS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'precomputed_answers.json')
+LANGUAGES = ('english', 'swahili')
+NEGATIONS = frozenset({'no', 'not', 'never', 'nor', 'without', 'cannot'})
+# The index drops "not" as noise, but here "can a landlord evict" and "can a landlord
+# not evict" must stay different questions
+QUESTION_STOPWORDS = STOPWORDS - NEGATIONS
+CONTRACTIONS = ((re.compile(r"\bcan['\u2019]t\b"), 'cannot'), (re.compile(r"n['\u2019]t\b"), ' not'))
+
+
+def normalize_question(question):
+    """Order-insensitive key with punctuation, stopwords and generic terms removed, negations kept"""
+    text = question.lower()
+    for pattern, replacement in CONTRACTIONS:
+        text = pattern.sub(replacement, text)
+    words = text.translate(PUNCTUATION_TABLE).split()
+    return " ".join(sorted(set(word for word in words if word not in QUESTION_STOPWORDS)))
+
+
+def negations(key):
+    return NEGATIONS.intersection(key.split())
+
+
+class AnswerTable:
+    """Normalized-question lookup table of ready-made answers per language"""
+
+    def __init__(self, path=ANSWERS_FILE, fuzzy_cutoff=0.9, max_age=86400):
+        self.path = path
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.max_age = max_age
+        self.entries = {}
+        # Replaced, never mutated, so fuzzy matching can scan it without the lock
+        self.keys = ()
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'fuzzy_hits': 0, 'misses': 0, 'refreshed': 0}
+        self.lock_file = None
+        self.loaded_mtime = None
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                mtime = os.fstat(f.fileno()).st_mtime
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.loaded_mtime = mtime
+        # Keys are recomputed so a table built before a normalization change still matches
+        entries = {}
+        for entry in data.get('entries', []):
+            entry['key'] = normalize_question(entry['question'])
+            entries[entry['key']] = entry
+        with self.lock:
+            self.entries = entries
+            self.keys = tuple(entries)
+
+    def save(self):
+        """Atomically write the table back to disk"""
+        with self.lock:
+            entries = sorted(self.entries.values(), key=lambda entry: -entry.get('count', 0))
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'entries': entries}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+        self.loaded_mtime = os.path.getmtime(self.path)
+
+    def lookup(self, question, language_mode):
+        """Return the precomputed answer for a question, or None"""
+        key = normalize_question(question)
+        with self.lock:
+            entry = self.entries.get(key)
+            keys = self.keys
+        fuzzy = False
+        if entry is None and key and keys:
+            # The linear scan runs on the key snapshot, outside the lock; a near match
+            # must agree on negation, or "not" would be one typo's difference away
+            for close in difflib.get_close_matches(key, keys, n=3, cutoff=self.fuzzy_cutoff):
+                if negations(close) == negations(key):
+                    with self.lock:
+                        entry = self.entries.get(close)
+                    fuzzy = entry is not None
+                    break
+
+        answer = entry['answers'].get(language_mode) if entry else None
+        with self.lock:
+            if answer is None:
+                self.counters['misses'] += 1
+            else:
+                self.counters['hits'] += 1
+                if fuzzy:
+                    self.counters['fuzzy_hits'] += 1
+        return answer
+
+    def put(self, question, answers, count=0):
+        key = normalize_question(question)
+        with self.lock:
+            if key not in self.entries:
+                self.keys = self.keys + (key,)
+            self.entries[key] = {
+                'key': key,
+                'question': question,
+                'count': count,
+                'answers': answers,
+                'generated_at': time.time(),
+            }
+
+    def generate(self, question, answer_fn, count=0):
+        """Answer a question in every language, storing it only if all answers succeeded"""
+        answers = {language: answer_fn(question, language) for language in LANGUAGES}
+        if any(answer is None for answer in answers.values()):
+            return False
+        self.put(question, answers, count)
+        return True
+
+    def refresh_stale(self, answer_fn):
+        """Regenerate entries older than max_age, keeping the old answer if regeneration fails"""
+        now = time.time()
+        with self.lock:
+            stale = [entry for entry in self.entries.values() if now - entry['generated_at'] > self.max_age]
+        refreshed = 0
+        for entry in stale:
+            if self.generate(entry['question'], answer_fn, entry.get('count', 0)):
+                refreshed += 1
+        if refreshed:
+            with self.lock:
+                self.counters['refreshed'] += refreshed
+            self.save()
+        return refreshed
+
+    def acquire_refresh_lock(self):
+        """Become the one process that refreshes the table; held until the process exits"""
+        if self.lock_file is not None or fcntl is None:
+            return True
+        lock_file = open(f"{self.path}.lock", 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self.lock_file = lock_file
+        return True
+
+    def reload_if_changed(self):
+        """Pick up a table saved by another process"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        if mtime == self.loaded_mtime:
+            return False
+        self.load()
+        return True
+
+    def start_refresher(self, answer_fn, interval=3600):
+        """Refresh stale entries on a background thread every interval seconds
+
+        With several worker processes only the holder of the lock file calls
+        the upstream; the others reload the file it saves.
+        """
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    if self.acquire_refresh_lock():
+                        self.refresh_stale(answer_fn)
+                    else:
+                        self.reload_if_changed()
+                except Exception:
+                    pass
+
+        thread = threading.Thread(target=run, name='answer-table-refresher', daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        """Return hit-rate counters; every hit is an upstream search avoided"""
+        with self.lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+            return dict(
+                self.counters,
+                size=len(self.entries),
+                hit_rate=self.counters['hits'] / lookups if lookups else 0.0,
+            )
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def read_logged_questions(path):
+    """Yield questions from a JSON-lines or plain-text request log, gzipped or not"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                try:
+                    question = json.loads(line).get('question')
+                except ValueError:
+                    continue
+                if question:
+                    yield question
+            else:
+                yield line
+
+
+def most_frequent_questions(questions, top):
+    """Group questions by normalized key and return (representative question, count) pairs"""
+    counts = Counter()
+    examples = {}
+    for question in questions:
+        key = normalize_question(question)
+        if not key:
+            continue
+        counts[key] += 1
+        examples.setdefault(key, question)
+    return [(examples[key], count) for key, count in counts.most_common(top)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='Precompute answers for the most frequent logged questions')
+    build_parser.add_argument('--log', required=True, nargs='+')
+    build_parser.add_argument('--top', type=int, default=100)
+    build_parser.add_argument('--output', default=ANSWERS_FILE)
+    args = parser.parse_args()
+
+    # Imported here so the table module itself doesn't depend on the Flask app
+    from app import assistant
+
+    questions = (question for path in args.log for question in read_logged_questions(path))
+    frequent = [(question, count) for question, count in most_frequent_questions(questions, args.top * 2)
+                if assistant.is_kenyan_law_question(question)][:args.top]
+
+    table = AnswerTable(args.output)
+    table.entries, table.keys = {}, ()
+    built = 0
+    for question, count in frequent:
+        if table.generate(question, assistant.search_answer, count):
+            built += 1
+        else:
+            print(f"Skipped (search failed): {question}")
+    table.save()
+    print(f"Precomputed {built} of {len(frequent)} frequent questions into {args.output}")
+
+
+if __name__ == '__main__':
+    main()
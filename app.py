@@ -1,10 +1,31 @@
-from flask import Flask, render_template, request, jsonify, session, send_from_directory
-import requests
+from flask import Flask, Response, abort, g, render_template, request, jsonify, session, send_from_directory, url_for
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.security import safe_join
 import os
 from dotenv import load_dotenv
 import random
 import base64
 import json
+import hashlib
+import mimetypes
+import uuid
+import time
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from conversation_store import create_conversation_store
+from search_cache import create_search_cache
+from http_client import CircuitOpenError, create_http_client
+from law_classifier import legal_classifier
+from law_index import load_law_index
+from answer_table import ANSWERS_FILE, AnswerTable
+from build_assets import DIST_DIR, load_manifest
+from metrics import (registry, rate_limited, request_seconds, requests_shed, sample_stacks, timed, timed_stream,
+                     upstream_errors, upstream_responses)
+from rate_limit import AdmissionControl, create_batch_limiter, create_rate_limiters, create_upstream_quota
+from journal import create_request_journal, note, question_hash, tracing
+from uploads import best_variant, cleanup_uploads, content_hash, save_upload, touch_upload
+from settings_store import UPLOAD_PREFIX, SettingsSchema, create_settings_store
+from page_cache import PageCache
 
 # Load environment variables
 load_dotenv()
@@ -14,16 +35,74 @@ app.secret_key = os.getenv('SECRET_KEY', 'fallback-secret-key')
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 
+# Behind a reverse proxy (e.g. Render) the client IP is in X-Forwarded-For; set the number of proxies to trust
+TRUST_PROXY_HOPS = int(os.getenv('TRUST_PROXY_HOPS', '0'))
+if TRUST_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUST_PROXY_HOPS, x_proto=TRUST_PROXY_HOPS)
+
 # Serper API configuration
 SERPER_API_KEY = os.getenv('SERPER_API_KEY')
-SERPER_API_URL = "https://google.serper.dev/search"
+SERPER_API_URL = os.getenv('SERPER_API_URL', "https://google.serper.dev/search")
+
+# Offline statute index: confident local matches are answered without a web search. The score
+# is normalized to [0, 1) (see LawIndex.search); 0.3 is roughly every query term once in a section
+# up to twice the average length. Tune it with `python law_index.py query` against your corpus
+LOCAL_INDEX_MIN_SCORE = float(os.getenv('LOCAL_INDEX_MIN_SCORE', '0.3'))
+LOCAL_INDEX_MIN_COVERAGE = float(os.getenv('LOCAL_INDEX_MIN_COVERAGE', '0.6'))
+
+# Precomputed answers for frequent questions, regenerated in the background once stale
+PRECOMPUTED_ANSWERS_FILE = os.getenv('PRECOMPUTED_ANSWERS_FILE', ANSWERS_FILE)
+PRECOMPUTED_REFRESH_INTERVAL = int(os.getenv('PRECOMPUTED_REFRESH_INTERVAL', '3600'))
+
+# Streaming chat: upstream searches run on a bounded pool and are abandoned after a deadline
+SEARCH_DEADLINE = float(os.getenv('SEARCH_DEADLINE', '8'))
+STREAM_HEARTBEAT = 2
+search_executor = ThreadPoolExecutor(max_workers=int(os.getenv('SEARCH_WORKERS', '8')), thread_name_prefix='search')
+
+# Batch triage: searches fan out on their own pool so a large batch can't starve streaming chats
+BATCH_MAX_QUESTIONS = int(os.getenv('BATCH_MAX_QUESTIONS', '50'))
+batch_executor = ThreadPoolExecutor(max_workers=int(os.getenv('BATCH_WORKERS', '16')), thread_name_prefix='batch')
+
+# Uploaded backgrounds are content-addressed, so they can be cached for a year
+UPLOAD_CACHE_MAX_AGE = 365 * 24 * 3600
+UPLOAD_RETENTION = int(os.getenv('UPLOAD_RETENTION', str(30 * 24 * 3600)))
+UPLOAD_CLEANUP_INTERVAL = 3600
+last_upload_cleanup = 0
+# Resizing uploads is CPU-heavy, so it happens off the request thread on a small pool
+upload_executor = ThreadPoolExecutor(max_workers=int(os.getenv('UPLOAD_WORKERS', '2')), thread_name_prefix='upload')
+
+# Fingerprinted assets from build_assets.py never change, so browsers can keep them forever
+ASSET_MANIFEST = load_manifest()
+ASSET_CACHE_MAX_AGE = 365 * 24 * 3600
+ASSET_ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+# Rendered index pages and background options, cached per settings profile
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv('PAGE_CACHE_MAX_ENTRIES', '256'))
+BACKGROUND_OPTIONS_MAX_AGE = 3600
+
+# Chat requests beyond this many in flight per worker get an immediate 429 instead of queueing
+CHAT_MAX_IN_FLIGHT = int(os.getenv('CHAT_MAX_IN_FLIGHT', '16'))
+CHAT_RETRY_AFTER = 1
+
+# Request journal; question text is only recorded (for replay) when JOURNAL_QUESTIONS=1
+JOURNAL_QUESTIONS = os.getenv('JOURNAL_QUESTIONS', '0') == '1'
+request_journal = create_request_journal()
+
+# Optional on-demand sampling profiler, enabled by setting PROFILER_TOKEN
+PROFILER_TOKEN = os.getenv('PROFILER_TOKEN')
 
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 class KenyanLawAssistant:
-    def __init__(self):
-        self.conversation_history = []
+    def __init__(self, store=None, search_cache=None, http_client=None, law_index=None, answer_table=None,
+                 upstream_quota=None):
+        self.store = store if store is not None else create_conversation_store()
+        self.search_cache = search_cache if search_cache is not None else create_search_cache()
+        self.http_client = http_client if http_client is not None else create_http_client()
+        self.law_index = law_index if law_index is not None else load_law_index()
+        self.answer_table = answer_table if answer_table is not None else AnswerTable(PRECOMPUTED_ANSWERS_FILE)
+        self.upstream_quota = upstream_quota if upstream_quota is not None else create_upstream_quota()
         self.setup_system_prompt()
     
     def setup_system_prompt(self):
@@ -58,30 +137,46 @@ class KenyanLawAssistant:
         - Financial advice beyond legal requirements
 
         Always be helpful, accurate, and focused on Kenyan legal matters."""
-        self.conversation_history.append({"role": "system", "content": system_prompt})
+        self.system_prompt = {"role": "system", "content": system_prompt}
+    
+    def get_history(self, session_id):
+        """Get the conversation history for a single session"""
+        return [self.system_prompt] + self.store.get(session_id)
     
+    def reset(self, session_id):
+        """Clear the conversation history for a single session"""
+        self.store.clear(session_id)
+    
+    @timed('is_kenyan_law_question')
     def is_kenyan_law_question(self, question):
-        """Check if the question is related to Kenyan law"""
-        kenyan_law_keywords = [
-            'kenya', 'kenyan', 'nairobi', 'mombasa', 'kisumu', 'nakuru', 'eldoret',
-            'law', 'legal', 'constitution', 'act', 'statute', 'court', 'judge',
-            'lawyer', 'advocate', 'legal advice', 'rights', 'constitutional',
-            'parliament', 'bill', 'legislation', 'regulation', 'high court',
-            'magistrate', 'supreme court', 'court of appeal', 'law society',
-            'attorney general', 'directorate of public prosecutions',
-            'civil procedure', 'criminal procedure', 'evidence act',
-            'penal code', 'civil code', 'business law', 'company law',
-            'employment act', 'labour law', 'family law', 'marriage act',
-            'children act', 'succession act', 'land act', 'registration act',
-            'rent restriction', 'tenant', 'landlord', 'contract act',
-            'tort', 'negligence', 'defamation', 'libel', 'slander'
-        ]
+        """Check if the question is related to Kenyan law, returning the legal terms it mentions"""
+        matches = legal_classifier.matches(question)
+        note(in_scope=bool(matches))
+        return matches
+    
+    def search_local(self, query):
+        """Answer from the offline statute index, or return None when it isn't confident"""
+        if self.law_index is None:
+            return None
         
-        question_lower = question.lower()
-        return any(keyword in question_lower for keyword in kenyan_law_keywords)
+        results = self.law_index.search(query, top_k=3)
+        if not results:
+            return None
+        
+        score, coverage, _ = results[0]
+        if score < LOCAL_INDEX_MIN_SCORE or coverage < LOCAL_INDEX_MIN_COVERAGE:
+            return None
+        
+        # Shaped like Serper results so format_search_results can render them
+        return {"organic": [doc for _, _, doc in results]}
     
-    def search_web(self, query):
-        """Search the web for Kenyan legal information"""
+    @timed('search_web')
+    def search_web(self, query, admit_upstream=None):
+        """Search the web for Kenyan legal information
+
+        admit_upstream, if given, is called on a cache miss to decide whether
+        this caller may spend an upstream search.
+        """
         try:
             # Check if API key is available
             if not SERPER_API_KEY or SERPER_API_KEY == "your_actual_serper_api_key_here":
@@ -97,118 +192,332 @@ class KenyanLawAssistant:
                 "num": 5
             }
             
-            headers = {
-                'X-API-KEY': SERPER_API_KEY,
-                'Content-Type': 'application/json'
-            }
-            
-            response = requests.post(SERPER_API_URL, json=payload, headers=headers, timeout=10)
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return {"error": f"API request failed with status {response.status_code}"}
+            # Identical questions share one cached (or in-flight) upstream call
+            cache_key = self.search_cache.make_key(query, payload["gl"], payload["hl"], payload["num"])
+            # Overwritten by fetch_search_results when this caller ends up going upstream
+            note(cache_hit=True)
+            return self.search_cache.get_or_fetch(cache_key, lambda: self.fetch_search_results(payload, admit_upstream))
                 
         except Exception as e:
             return {"error": f"Search failed: {str(e)}"}
     
-    def format_search_results(self, search_data):
-        """Format search results into a readable response"""
-        if "error" in search_data:
-            return f"Search error: {search_data['error']}"
+    def fetch_search_results(self, payload, admit_upstream=None):
+        """Send a search request to the Serper API, unless a rate limit or the quota says no"""
+        note(cache_hit=False)
+        # While the breaker is open the call can't go through, so don't spend rate limit
+        # tokens or quota on it
+        if self.http_client.breaker.state == 'open':
+            upstream_errors.inc('circuit_open')
+            return {"error": "Search service temporarily unavailable", "transient": True}
+        # Refusals are transient so they aren't cached; callers fall back to a general answer
+        if admit_upstream is not None and not admit_upstream():
+            return {"error": "Search rate limit reached", "transient": True}
+        if not self.upstream_quota.acquire():
+            upstream_errors.inc('quota')
+            return {"error": "Search quota exhausted", "transient": True}
         
-        response_parts = []
+        headers = {
+            'X-API-KEY': SERPER_API_KEY,
+            'Content-Type': 'application/json'
+        }
         
+        start = time.perf_counter()
+        try:
+            response = self.http_client.post(SERPER_API_URL, json=payload, headers=headers)
+        except CircuitOpenError:
+            # Upstream is unhealthy (the breaker opened, or another call holds the half-open
+            # trial); hand back the quota and fall back to general guidance without waiting
+            self.upstream_quota.release()
+            upstream_errors.inc('circuit_open')
+            return {"error": "Search service temporarily unavailable", "transient": True}
+        except Exception as e:
+            upstream_errors.inc(type(e).__name__)
+            raise
+        
+        upstream_responses.inc(str(response.status_code))
+        note(upstream_latency=round(time.perf_counter() - start, 4))
+        if response.status_code == 200:
+            return response.json()
+        else:
+            return {"error": f"API request failed with status {response.status_code}"}
+    
+    def iter_search_result_parts(self, search_data):
+        """Yield formatted sections of the search results one at a time"""
         # Add knowledge graph if available
         if "knowledgeGraph" in search_data:
             kg = search_data["knowledgeGraph"]
+            kg_parts = []
             if "title" in kg:
-                response_parts.append(f"**{kg['title']}**")
+                kg_parts.append(f"**{kg['title']}**")
             if "description" in kg:
-                response_parts.append(kg["description"])
+                kg_parts.append(kg["description"])
+            if kg_parts:
+                yield "\n".join(kg_parts)
         
         # Add organic results
         if "organic" in search_data and search_data["organic"]:
             organic_results = search_data["organic"][:3]
-            response_parts.append("\n**Legal Sources:**")
+            yield "\n**Legal Sources:**"
             
             for i, result in enumerate(organic_results, 1):
                 title = result.get("title", "No title")
                 link = result.get("link", "")
                 snippet = result.get("snippet", "No description available")
                 
-                response_parts.append(f"{i}. **{title}**")
-                response_parts.append(f"   {snippet}")
+                source_parts = [f"{i}. **{title}**", f"   {snippet}"]
                 if link:
-                    response_parts.append(f"   *Source: {link}*")
-                response_parts.append("")
+                    source_parts.append(f"   *Source: {link}*")
+                source_parts.append("")
+                yield "\n".join(source_parts)
         else:
-            response_parts.append("No specific legal sources found for this query.")
+            yield "No specific legal sources found for this query."
+    
+    @timed('format_search_results')
+    def search_result_parts(self, search_data):
+        """Formatted sections of the search results as a list"""
+        return list(self.iter_search_result_parts(search_data))
+    
+    def format_search_results(self, search_data):
+        """Format search results into a readable response"""
+        if "error" in search_data:
+            return f"Search error: {search_data['error']}"
         
+        response_parts = self.search_result_parts(search_data)
         return "\n".join(response_parts) if response_parts else "No relevant legal information found."
 
-    def get_kenyan_law_response(self, user_message, language_mode):
+    def out_of_scope_response(self, language_mode):
+        """Polite refusal for questions outside Kenyan law"""
+        note(source="out_of_scope")
+        if language_mode == 'swahili':
+            return "Samahani, mimi ninajikita tu kwenye masuala ya sheria za Kenya. Tafadhali uliza swali kuhusu sheria za Kenya, katiba, au mfumo wa kisheria wa Kenya."
+        else:
+            return "I apologize, but I specialize exclusively in Kenyan law matters. Please ask questions about Kenyan laws, constitution, or legal system in Kenya."
+    
+    def response_header(self, language_mode):
+        if language_mode == 'swahili':
+            return "**Jibu kuhusu sheria za Kenya:**"
+        return "**Regarding Kenyan Law:**"
+    
+    def response_disclaimer(self, language_mode):
+        if language_mode == 'swahili':
+            return "*Ikumbukwe: Huu ni ushauri wa kisheria na unapaswa kushauriana na wakili aliyeandikishwa kwa maelezo kamili.*"
+        return "*Disclaimer: This is legal information and you should consult a registered advocate for complete legal advice.*"
+    
+    def error_response(self, language_mode):
+        """Apology shown when answering fails unexpectedly"""
+        if language_mode == 'swahili':
+            return "Samahani, nimekutana na tatizo la kiufundi wakati wa kuchakata swali lako la kisheria. Tafadhali jaribu tena."
+        return "Sorry, I encountered a technical issue while processing your legal query. Please try again."
+    
+    def general_response(self, user_message, language_mode):
+        """Provide general Kenyan law guidance when search fails"""
+        note(source="fallback")
+        general_responses = {
+            'english': [
+                f"Regarding your question about '{user_message}' in Kenyan law: While I couldn't retrieve current search results, I can mention that Kenyan legal matters are governed by the Constitution of Kenya 2010 and various Acts of Parliament. For specific legal advice, consult the Law Society of Kenya or a registered advocate.",
+                f"For your query '{user_message}' under Kenyan law: The Kenyan legal system includes the Supreme Court, Court of Appeal, High Court, and subordinate courts. Specific legal procedures and requirements vary by the type of case. Please consult official Kenyan legal resources or a qualified advocate.",
+                f"Concerning '{user_message}' in Kenyan law: Kenya's legal framework includes statutory law, common law, and African customary law. The Constitution is the supreme law. For accurate, current information on this legal matter, refer to Kenya Law Reform Commission or official government publications."
+            ],
+            'swahili': [
+                f"Kuhusu swali lako '{user_message}' katika sheria za Kenya: Ingawa sikuweza kupata matokeo ya sasa, naweza kutaja kuwa mambo ya kisheria nchini Kenya yanatawaliwa na Katiba ya Kenya ya 2010 na Vitendo mbalimbali vya Bunge. Kwa ushauri maalum wa kisheria, wasiliana na Jumuiya ya Wanasheria Kenya au wakali aliyeandikishwa.",
+                f"Kwa swali lako '{user_message}' chini ya sheria za Kenya: Mfumo wa sheria wa Kenya unajumuisha Mahakama Kuu, Mahakama ya Rufaa, Mahakama ya Juu, na mahakama za chini. Taratibu maalum za kisheria na mahitaji hutofautiana kulingana na aina ya kesi. Tafadhali wasiliana na rasilimali rasmi za kisheria za Kenya au wakali mhitimu.",
+                f"Kuhusu '{user_message}' katika sheria za Kenya: Mfumo wa kisheria wa Kenya unajumuisha sheria za kikatiba, sheria za kawaida, na sheria za kitamaduni za Kiafrika. Katiba ndio sheria kuu. Kwa habari sahihi ya sasa kuhusu jambo hili la kisheria, rejea Tume ya Mageuzi ya Sheria Kenya au machapisho rasmi ya serikali."
+            ]
+        }
+        
+        return random.choice(general_responses[language_mode])
+
+    def find_search_results(self, user_message, admit_upstream=None):
+        """Answer from the local statute index, or perform web search for Kenyan legal queries"""
+        local_results = self.search_local(user_message)
+        if local_results is not None:
+            note(source="local")
+            return local_results
+        note(source="search")
+        return self.search_web(user_message, admit_upstream)
+    
+    def format_answer(self, search_results, language_mode):
+        """Wrap search results in the language's header and disclaimer, or return None if the search failed"""
+        if "error" in search_results:
+            return None
+        
+        search_based_response = self.format_search_results(search_results)
+        return f"{self.response_header(language_mode)}\n\n{search_based_response}\n\n{self.response_disclaimer(language_mode)}"
+    
+    def search_answer(self, user_message, language_mode, admit_upstream=None):
+        """Build an answer from local or web search results, or return None if the search failed"""
+        return self.format_answer(self.find_search_results(user_message, admit_upstream), language_mode)
+
+    def get_kenyan_law_response(self, user_message, language_mode, admit_upstream=None):
         """Provide Kenyan law specific responses"""
         if not self.is_kenyan_law_question(user_message):
-            if language_mode == 'swahili':
-                return "Samahani, mimi ninajikita tu kwenye masuala ya sheria za Kenya. Tafadhali uliza swali kuhusu sheria za Kenya, katiba, au mfumo wa kisheria wa Kenya."
-            else:
-                return "I apologize, but I specialize exclusively in Kenyan law matters. Please ask questions about Kenyan laws, constitution, or legal system in Kenya."
+            return self.out_of_scope_response(language_mode)
         
-        # Perform web search for Kenyan legal queries
-        search_results = self.search_web(user_message)
+        # Frequent questions are answered from the precomputed table without searching
+        precomputed = self.answer_table.lookup(user_message, language_mode)
+        if precomputed is not None:
+            note(source="precomputed")
+            return precomputed
         
-        if "error" not in search_results:
-            search_based_response = self.format_search_results(search_results)
-            
-            if language_mode == 'swahili':
-                return f"**Jibu kuhusu sheria za Kenya:**\n\n{search_based_response}\n\n*Ikumbukwe: Huu ni ushauri wa kisheria na unapaswa kushauriana na wakili aliyeandikishwa kwa maelezo kamili.*"
-            else:
-                return f"**Regarding Kenyan Law:**\n\n{search_based_response}\n\n*Disclaimer: This is legal information and you should consult a registered advocate for complete legal advice.*"
+        answer = self.search_answer(user_message, language_mode, admit_upstream)
+        if answer is None:
+            return self.general_response(user_message, language_mode)
+        return answer
+    
+    def stream_kenyan_law_response(self, user_message, language_mode, admit_upstream=None):
+        """Yield (event, text) pairs for a Kenyan law response as each part becomes ready"""
+        if not self.is_kenyan_law_question(user_message):
+            yield "message", self.out_of_scope_response(language_mode)
+            return
+        
+        precomputed = self.answer_table.lookup(user_message, language_mode)
+        if precomputed is not None:
+            note(source="precomputed")
+            yield "message", precomputed
+            return
+        
+        # The header and disclaimer don't depend on the search, so send them straight away
+        yield "header", self.response_header(language_mode)
+        yield "disclaimer", self.response_disclaimer(language_mode)
+        
+        search_results = self.search_local(user_message)
+        if search_results is not None:
+            note(source="local")
         else:
-            # Provide general Kenyan law guidance when search fails
-            general_responses = {
-                'english': [
-                    f"Regarding your question about '{user_message}' in Kenyan law: While I couldn't retrieve current search results, I can mention that Kenyan legal matters are governed by the Constitution of Kenya 2010 and various Acts of Parliament. For specific legal advice, consult the Law Society of Kenya or a registered advocate.",
-                    f"For your query '{user_message}' under Kenyan law: The Kenyan legal system includes the Supreme Court, Court of Appeal, High Court, and subordinate courts. Specific legal procedures and requirements vary by the type of case. Please consult official Kenyan legal resources or a qualified advocate.",
-                    f"Concerning '{user_message}' in Kenyan law: Kenya's legal framework includes statutory law, common law, and African customary law. The Constitution is the supreme law. For accurate, current information on this legal matter, refer to Kenya Law Reform Commission or official government publications."
-                ],
-                'swahili': [
-                    f"Kuhusu swali lako '{user_message}' katika sheria za Kenya: Ingawa sikuweza kupata matokeo ya sasa, naweza kutaja kuwa mambo ya kisheria nchini Kenya yanatawaliwa na Katiba ya Kenya ya 2010 na Vitendo mbalimbali vya Bunge. Kwa ushauri maalum wa kisheria, wasiliana na Jumuiya ya Wanasheria Kenya au wakali aliyeandikishwa.",
-                    f"Kwa swali lako '{user_message}' chini ya sheria za Kenya: Mfumo wa sheria wa Kenya unajumuisha Mahakama Kuu, Mahakama ya Rufaa, Mahakama ya Juu, na mahakama za chini. Taratibu maalum za kisheria na mahitaji hutofautiana kulingana na aina ya kesi. Tafadhali wasiliana na rasilimali rasmi za kisheria za Kenya au wakali mhitimu.",
-                    f"Kuhusu '{user_message}' katika sheria za Kenya: Mfumo wa kisheria wa Kenya unajumuisha sheria za kikatiba, sheria za kawaida, na sheria za kitamaduni za Kiafrika. Katiba ndio sheria kuu. Kwa habari sahihi ya sasa kuhusu jambo hili la kisheria, rejea Tume ya Mageuzi ya Sheria Kenya au machapisho rasmi ya serikali."
-                ]
-            }
+            note(source="search")
+            # Search on the bounded search pool so a slow upstream is abandoned after the deadline;
+            # the copied context carries this request's journal record into the pool thread
+            future = search_executor.submit(contextvars.copy_context().run, self.search_web, user_message, admit_upstream)
+            deadline = time.monotonic() + SEARCH_DEADLINE
+            while True:
+                try:
+                    search_results = future.result(timeout=min(STREAM_HEARTBEAT, max(0, deadline - time.monotonic())))
+                    break
+                except FutureTimeoutError:
+                    if time.monotonic() >= deadline:
+                        search_results = {"error": "Search timed out"}
+                        break
+                    yield "ping", ""
+        
+        if "error" in search_results:
+            yield "fallback", self.general_response(user_message, language_mode)
+            return
+        
+        for part in self.search_result_parts(search_results):
+            yield "source", part
+    
+    def answer_batch(self, questions, admit_upstream=None, executor=None, deadline=SEARCH_DEADLINE):
+        """Answer (message, language_mode) pairs, yielding (index, source, response) in completion order
+
+        Each distinct question is classified and searched once, whatever
+        languages it was asked in, and the searches run concurrently so the
+        batch takes about as long as its slowest search. Searches still
+        running at the deadline are answered with the general fallback.
+        """
+        executor = executor or batch_executor
+        groups = {}
+        for index, (message, language_mode) in enumerate(questions):
+            groups.setdefault(" ".join(message.lower().split()), []).append((index, message, language_mode))
+        
+        # Start every search before yielding anything, so none waits on the client reading
+        immediate, pending = [], {}
+        for members in groups.values():
+            message = members[0][1]
+            if not self.is_kenyan_law_question(message):
+                immediate.extend((index, "out_of_scope", self.out_of_scope_response(language_mode))
+                                 for index, _, language_mode in members)
+                continue
             
-            import random
-            return random.choice(general_responses[language_mode])
+            unanswered = []
+            for index, _, language_mode in members:
+                precomputed = self.answer_table.lookup(message, language_mode)
+                if precomputed is not None:
+                    immediate.append((index, "precomputed", precomputed))
+                else:
+                    unanswered.append((index, language_mode))
+            if unanswered:
+                pending[executor.submit(self.find_search_results, message, admit_upstream)] = (message, unanswered)
+        
+        end = time.monotonic() + deadline
+        yield from immediate
+        while pending:
+            done, _ = wait(pending, timeout=max(0, end - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                message, unanswered = pending.pop(future)
+                try:
+                    search_results = future.result()
+                except Exception:
+                    search_results = {"error": "Search failed"}
+                for index, language_mode in unanswered:
+                    answer = self.format_answer(search_results, language_mode)
+                    if answer is None:
+                        yield index, "fallback", self.general_response(message, language_mode)
+                    else:
+                        yield index, "search", answer
+        
+        # Past the deadline: don't start what hasn't started, and answer the rest without it
+        for future, (message, unanswered) in pending.items():
+            future.cancel()
+            for index, language_mode in unanswered:
+                yield index, "fallback", self.general_response(message, language_mode)
     
-    def get_response(self, user_message, language_mode='english'):
+    @timed('get_response')
+    def get_response(self, user_message, language_mode='english', session_id='default', admit_upstream=None):
         """Get response focused exclusively on Kenyan law"""
         try:
-            # Add user message to history
-            self.conversation_history.append({"role": "user", "content": user_message})
+            # Add user message to history (the store caps each session's length)
+            self.store.append(session_id, "user", user_message)
             
             # Get Kenyan law specific response
-            final_response = self.get_kenyan_law_response(user_message, language_mode)
+            final_response = self.get_kenyan_law_response(user_message, language_mode, admit_upstream)
             
             # Add bot response to history
-            self.conversation_history.append({"role": "assistant", "content": final_response})
-            
-            # Keep conversation history manageable
-            if len(self.conversation_history) > 21:
-                self.conversation_history = [self.conversation_history[0]] + self.conversation_history[-20:]
+            self.store.append(session_id, "assistant", final_response)
             
             return final_response
             
         except Exception as e:
-            error_msg_en = "Sorry, I encountered a technical issue while processing your legal query. Please try again."
-            error_msg_sw = "Samahani, nimekutana na tatizo la kiufundi wakati wa kuchakata swali lako la kisheria. Tafadhali jaribu tena."
-            
-            return error_msg_sw if language_mode == 'swahili' else error_msg_en
+            return self.error_response(language_mode)
+    
+    @timed_stream('stream_response')
+    def stream_response(self, user_message, language_mode='english', session_id='default', admit_upstream=None):
+        """Stream a response as (event, text) pairs, recording the assembled answer in history"""
+        header, disclaimer, sources, final_response = None, None, [], None
+        
+        try:
+            # Inside the try, so a failing store still ends the stream with the error text
+            self.store.append(session_id, "user", user_message)
+            for event, text in self.stream_kenyan_law_response(user_message, language_mode, admit_upstream):
+                if event == "header":
+                    header = text
+                elif event == "disclaimer":
+                    disclaimer = text
+                elif event == "source":
+                    sources.append(text)
+                elif event in ("message", "fallback"):
+                    final_response = text
+                yield event, text
+        except Exception as e:
+            final_response = self.error_response(language_mode)
+            yield "fallback", final_response
+        finally:
+            # Also runs when the client disconnects mid-stream, recording what was sent so far
+            if final_response is None:
+                body = "\n".join(sources)
+                final_response = "\n\n".join(part for part in (header, body, disclaimer) if part)
+            if final_response:
+                try:
+                    self.store.append(session_id, "assistant", final_response)
+                except Exception:
+                    # The answer has been sent; losing it from history must not cut off the stream
+                    pass
 
 # Initialize assistant
 assistant = KenyanLawAssistant()
+if len(assistant.answer_table) and PRECOMPUTED_REFRESH_INTERVAL > 0:
+    assistant.answer_table.start_refresher(assistant.search_answer, PRECOMPUTED_REFRESH_INTERVAL)
 
 # Background options similar to WhatsApp
 BACKGROUND_OPTIONS = {
@@ -237,70 +546,356 @@ BACKGROUND_OPTIONS = {
         {'id': 'pattern_zigzag', 'name': 'Zigzag', 'value': 'linear-gradient(135deg, #e0e0e0 25%, transparent 25%), linear-gradient(225deg, #e0e0e0 25%, transparent 25%), linear-gradient(315deg, #e0e0e0 25%, transparent 25%), linear-gradient(45deg, #e0e0e0 25%, transparent 25%)', 'type': 'pattern', 'size': '20px 20px'},
     ],
     'images': [
-        {'id': 'image_1', 'name': 'Nature', 'value': 'bg1.jpg', 'type': 'image'},
-        {'id': 'image_2', 'name': 'Mountains', 'value': 'bg2.jpg', 'type': 'image'},
-        {'id': 'image_3', 'name': 'Beach', 'value': 'bg3.jpg', 'type': 'image'},
+        {'id': 'image_1', 'name': 'Nature', 'value': 'bg1.jpeg', 'type': 'image'},
+        {'id': 'image_2', 'name': 'Mountains', 'value': 'bg2.jpeg', 'type': 'image'},
+        {'id': 'image_3', 'name': 'Beach', 'value': 'bg3.jpeg', 'type': 'image'},
     ]
 }
 
+# Settings live server-side; the cookie only carries the session ID
+settings_schema = SettingsSchema(BACKGROUND_OPTIONS)
+settings_store = create_settings_store()
+# Keys older cookies carried directly, moved into the settings store on first sight
+LEGACY_SESSION_KEYS = ('background_settings', 'language', 'font_family', 'font_size',
+                       'primary_color', 'theme_mode', 'theme')
+
+def get_session_id():
+    """Get or assign the ID that keys this client's conversation history and settings"""
+    if 'sid' not in session:
+        session['sid'] = uuid.uuid4().hex
+    return session['sid']
+
+def validate_settings(settings):
+    """Validate client-supplied settings, raising ValueError on the first bad one"""
+    changes = {}
+    for key, value in settings.items():
+        if key == 'background_settings' and isinstance(value, dict):
+            changes['background'] = settings_schema.background_id(value.get('type'), value.get('value'))
+        else:
+            changes[key] = settings_schema.validate(key, value)
+    return changes
+
+def migrate_legacy_settings(session_id):
+    legacy = {key: session.pop(key) for key in LEGACY_SESSION_KEYS if key in session}
+    if 'theme_mode' in legacy:
+        legacy.setdefault('theme', legacy.pop('theme_mode'))
+    changes = {}
+    for key, value in legacy.items():
+        try:
+            changes.update(validate_settings({key: value}))
+        except ValueError:
+            pass
+    return settings_store.update(session_id, changes) if changes else None
+
+def get_settings():
+    """This session's settings, loaded at most once per request"""
+    if 'settings' not in g:
+        session_id = get_session_id()
+        g.settings = migrate_legacy_settings(session_id) or settings_store.get(session_id)
+    return g.settings
+
+def update_session_settings(changes):
+    g.settings = settings_store.update(get_session_id(), changes)
+    return g.settings
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        # Label by route pattern rather than URL so uploads and assets don't explode the series count
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        labels = (request.method, route, response.status_code)
+        if response.is_streamed:
+            # A streamed body is only produced after this hook, so time it until the stream closes
+            response.call_on_close(lambda: request_seconds.observe(time.perf_counter() - start, *labels))
+        else:
+            request_seconds.observe(time.perf_counter() - start, *labels)
+    return response
+
+def collect_app_metrics():
+    """Cache, answer table and circuit breaker gauges, read at scrape time"""
+    search = assistant.search_cache.stats()
+    answers = assistant.answer_table.stats()
+    pages = page_cache.stats()
+    journal = request_journal.stats() if request_journal is not None else None
+    quota = assistant.upstream_quota.usage()
+    breaker_state = assistant.http_client.breaker.state
+    samples = [
+        ('juahaki_search_cache_events_total', 'counter', 'Search cache lookups by outcome',
+         {(('event', event),): search[event] for event in ('hits', 'misses', 'coalesced', 'evictions', 'negative_hits')}),
+        ('juahaki_search_cache_entries', 'gauge', 'Entries in the search cache', {(): search['size']}),
+        ('juahaki_precomputed_answer_lookups_total', 'counter', 'Precomputed answer lookups by outcome',
+         {(('event', event),): answers[event] for event in ('hits', 'fuzzy_hits', 'misses')}),
+        ('juahaki_page_cache_events_total', 'counter', 'Rendered page cache lookups by outcome',
+         {(('event', event),): pages[event] for event in ('hits', 'misses', 'invalidations')}),
+        ('juahaki_upstream_quota_used', 'gauge', 'Serper searches counted against each budget period',
+         {(('period', 'day'),): quota['daily_used'], (('period', 'month'),): quota['monthly_used']}),
+        ('juahaki_upstream_circuit_open', 'gauge', '1 while the Serper circuit breaker is open',
+         {(): int(breaker_state == 'open')}),
+    ]
+    if journal is not None:
+        samples.append(('juahaki_journal_records_total', 'counter', 'Request journal records by outcome',
+                        {(('event', event),): journal[event] for event in ('written', 'dropped', 'errors')}))
+    return samples
+
+registry.add_collector(collect_app_metrics)
+
+@app.route('/metrics')
+def metrics():
+    """Expose metrics in the Prometheus text format"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/profile')
+def profile():
+    """Sample all threads' stacks for a few seconds and return them as collapsed stacks"""
+    if not PROFILER_TOKEN or request.args.get('token') != PROFILER_TOKEN:
+        abort(404)
+    seconds = min(request.args.get('seconds', 5, type=float), 60)
+    return Response(sample_stacks(seconds), mimetype='text/plain')
+
+def page_cache_version():
+    """Changes whenever a cached page would: template edits or different background options"""
+    template_dir = os.path.join(app.root_path, app.template_folder)
+    mtimes = tuple(sorted((name, os.stat(os.path.join(template_dir, name)).st_mtime_ns)
+                          for name in os.listdir(template_dir)))
+    options = hashlib.sha256(json.dumps(BACKGROUND_OPTIONS, sort_keys=True).encode('utf-8')).hexdigest()
+    return mtimes, options, tuple(sorted(ASSET_MANIFEST.items()))
+
+def clear_template_cache():
+    # Jinja only rechecks template files in debug mode, so drop its compiled copies along with ours
+    if app.jinja_env.cache is not None:
+        app.jinja_env.cache.clear()
+
+page_cache = PageCache(page_cache_version, max_entries=PAGE_CACHE_MAX_ENTRIES, on_invalidate=clear_template_cache)
+
+def render_index(settings):
+    return render_template('index.html', 
+                         background_settings=settings_schema.background(settings['background']),
+                         language=settings['language'],
+                         font_family=settings['font_family'],
+                         font_size=settings['font_size'],
+                         primary_color=settings['primary_color'])
+
 @app.route('/')
 def index():
-    # Initialize session defaults with proper background persistence
-    if 'background_settings' not in session:
-        session['background_settings'] = {
-            'type': 'solid',
-            'value': '#ffffff',
-            'size': ''
-        }
-    
-    if 'language' not in session:
-        session['language'] = 'english'
+    settings = get_settings()
     
-    if 'font_family' not in session:
-        session['font_family'] = 'Inter'
+    # Keep the session's uploaded background from being cleaned up
+    if settings['background'].startswith(UPLOAD_PREFIX):
+        touch_upload(app.config['UPLOAD_FOLDER'], settings['background'][len(UPLOAD_PREFIX):])
     
-    if 'font_size' not in session:
-        session['font_size'] = '16px'
+    # The page depends only on these settings, so every session sharing them shares one render
+    profile = ('index', settings['background'], settings['language'], settings['font_family'],
+               settings['font_size'], settings['primary_color'])
+    etag, body = page_cache.get_or_render(profile, lambda: render_index(settings))
     
-    if 'primary_color' not in session:
-        session['primary_color'] = '#10a37f'
-    
-    if 'theme_mode' not in session:
-        session['theme_mode'] = 'light'
+    response = Response(body, mimetype='text/html')
+    response.set_etag(etag)
+    # Per-session content: browsers may keep it but must revalidate, which is a 304 when unchanged
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/background-options')
+def background_options():
+    """Background presets as JSON, shared by every session and cached by browsers"""
+    def render():
+        options = {group: [dict(option) for option in items] for group, items in BACKGROUND_OPTIONS.items()}
+        for option in options['images']:
+            option['url'] = asset_url('backgrounds/' + option['value'])
+        return json.dumps(options)
     
-    # Get background settings with safe defaults
-    background_settings = session.get('background_settings', {
-        'type': 'solid',
-        'value': '#ffffff', 
-        'size': ''
-    })
+    etag, body = page_cache.get_or_render(('background-options',), render)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = BACKGROUND_OPTIONS_MAX_AGE
+    return response.make_conditional(request)
+
+def new_journal_record(route, user_message, language_mode):
+    """Start the journal record that the answer path fills in through journal.note()"""
+    if request_journal is None:
+        return None
+    record = {
+        'ts': round(time.time(), 3),
+        'route': route,
+        'question_hash': question_hash(user_message),
+        'language': language_mode,
+        'in_scope': None,
+        'source': None,
+        'cache_hit': None,
+        'upstream_latency': None,
+    }
+    if JOURNAL_QUESTIONS:
+        record['question'] = user_message
+    return record
+
+def write_journal_record(record, response_bytes, start):
+    if record is None:
+        return
+    record['response_bytes'] = response_bytes
+    record['latency'] = round(time.perf_counter() - start, 4)
+    request_journal.record(record)
+
+chat_admission = AdmissionControl(CHAT_MAX_IN_FLIGHT)
+session_limiter, ip_limiter = create_rate_limiters()
+batch_limiter = create_batch_limiter()
+
+def too_busy():
+    """Fast 429 for requests shed by admission control"""
+    requests_shed.inc(request.url_rule.rule)
+    response = jsonify({'status': 'error', 'message': 'The service is busy, please try again shortly'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(CHAT_RETRY_AFTER)
+    return response
+
+def upstream_admission(session_id):
+    """Return a check that spends one of this client's web searches when a search misses the cache
+
+    Over either limit the request still gets an answer, just from the
+    cache, the local index or the general fallback.
+    """
+    client_ip = request.remote_addr or 'unknown'
     
-    return render_template('index.html', 
-                         background_settings=background_settings,
-                         language=session.get('language', 'english'),
-                         font_family=session.get('font_family', 'Inter'),
-                         font_size=session.get('font_size', '16px'),
-                         primary_color=session.get('primary_color', '#10a37f'),
-                         background_options=BACKGROUND_OPTIONS)
+    def admit():
+        for limit, limiter, key in (('session', session_limiter, session_id), ('ip', ip_limiter, client_ip)):
+            allowed, _ = limiter.allow(key)
+            if not allowed:
+                rate_limited.inc(limit)
+                return False
+        return True
+    return admit
 
 @app.route('/chat', methods=['POST'])
 def chat():
     user_message = request.json.get('message', '')
-    language_mode = session.get('language', 'english')
+    language_mode = get_settings()['language']
     
     if not user_message.strip():
         return jsonify({'response': 'Please enter your legal question...'})
     
-    # Get assistant response
-    bot_response = assistant.get_response(user_message, language_mode)
+    if not chat_admission.try_enter():
+        return too_busy()
+    start = time.perf_counter()
+    trace = new_journal_record('/chat', user_message, language_mode)
+    try:
+        # Get assistant response
+        session_id = get_session_id()
+        with tracing(trace):
+            bot_response = assistant.get_response(user_message, language_mode, session_id, upstream_admission(session_id))
+    finally:
+        chat_admission.leave()
     
+    write_journal_record(trace, len(bot_response.encode('utf-8')), start)
     return jsonify({'response': bot_response})
 
+def sse_event(event, data):
+    """Encode a server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream the response as server-sent events, sending each part as soon as it is ready"""
+    user_message = request.json.get('message', '')
+    language_mode = get_settings()['language']
+    session_id = get_session_id()
+    admit_upstream = upstream_admission(session_id)
+    
+    if not chat_admission.try_enter():
+        return too_busy()
+    
+    def generate():
+        if not user_message.strip():
+            yield sse_event('message', 'Please enter your legal question...')
+        else:
+            start = time.perf_counter()
+            trace = new_journal_record('/chat/stream', user_message, language_mode)
+            size = 0
+            # Recorded even if the client goes away mid-stream
+            try:
+                with tracing(trace):
+                    for event, text in assistant.stream_response(user_message, language_mode, session_id, admit_upstream):
+                        size += len(text.encode('utf-8'))
+                        yield sse_event(event, text)
+            finally:
+                write_journal_record(trace, size, start)
+        yield sse_event('done', '')
+    
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # The slot is held until the stream finishes or the client goes away
+    response.call_on_close(chat_admission.leave)
+    return response
+
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch():
+    """Triage a list of questions, streaming one NDJSON line per answer as each is ready
+
+    Accepts {"questions": [{"message": ..., "language": "english"|"swahili", "id": ...}, ...]};
+    plain strings are asked in the session's language.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('questions')
+    if not isinstance(items, list) or not items:
+        return jsonify({'status': 'error', 'message': 'Provide a non-empty "questions" list'}), 400
+    if len(items) > BATCH_MAX_QUESTIONS:
+        return jsonify({'status': 'error', 'message': f'At most {BATCH_MAX_QUESTIONS} questions per batch'}), 400
+    
+    default_language = get_settings()['language']
+    questions, ids = [], []
+    for item in items:
+        if isinstance(item, str):
+            item = {'message': item}
+        if not isinstance(item, dict) or not isinstance(item.get('message'), str) or not item['message'].strip():
+            return jsonify({'status': 'error', 'message': 'Every question needs a non-empty "message"'}), 400
+        try:
+            language_mode = settings_schema.validate('language', item.get('language', default_language))
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        questions.append((item['message'], language_mode))
+        ids.append(item.get('id'))
+    
+    if not chat_admission.try_enter():
+        return too_busy()
+    
+    # A batch is admitted to web search as a whole, so triage lists aren't cut short by the
+    # per-question chat limits; each search still counts against the upstream quota
+    search_allowed, _ = batch_limiter.allow(request.remote_addr or 'unknown')
+    admit_upstream = None
+    if not search_allowed:
+        rate_limited.inc('batch')
+        admit_upstream = lambda: False
+    
+    def generate():
+        start = time.monotonic()
+        for index, source, text in assistant.answer_batch(questions, admit_upstream):
+            yield json.dumps({
+                'index': index,
+                'id': ids[index],
+                'language': questions[index][1],
+                'in_scope': source != 'out_of_scope',
+                'source': source,
+                'response': text
+            }) + "\n"
+        yield json.dumps({'done': True, 'count': len(questions), 'elapsed': round(time.monotonic() - start, 3)}) + "\n"
+    
+    response = Response(generate(), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    response.call_on_close(chat_admission.leave)
+    return response
+
 @app.route('/reset', methods=['POST'])
 def reset_chat():
     """Reset conversation history"""
-    assistant.conversation_history = []
-    assistant.setup_system_prompt()
+    assistant.reset(get_session_id())
     return jsonify({'status': 'success', 'message': 'Conversation cleared'})
 
 @app.route('/update-settings', methods=['POST'])
@@ -310,11 +905,13 @@ def update_settings():
         data = request.json
         settings = data.get('settings', {})
         
-        # Update session with new settings
-        for key, value in settings.items():
-            session[key] = value
+        # Only known settings with allowed values are stored
+        try:
+            changes = validate_settings(settings)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
         
-        session.modified = True
+        update_session_settings(changes)
         return jsonify({'status': 'success', 'message': 'Settings updated successfully'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
@@ -324,22 +921,18 @@ def set_background():
     """Set background from predefined options"""
     try:
         data = request.json
-        bg_type = data.get('type')
-        bg_value = data.get('value')
-        bg_size = data.get('size', '')
+        # Presets are stored by ID; the size always comes from the preset itself
+        try:
+            background_id = settings_schema.background_id(data.get('type'), data.get('value'))
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'Unknown background'}), 400
         
-        # Update session with complete background settings
-        session['background_settings'] = {
-            'type': bg_type,
-            'value': bg_value,
-            'size': bg_size
-        }
-        session.modified = True
+        settings = update_session_settings({'background': background_id})
         
         return jsonify({
             'status': 'success', 
             'message': 'Background updated successfully',
-            'background': session['background_settings']
+            'background': settings_schema.background(settings['background'])
         })
             
     except Exception as e:
@@ -361,25 +954,20 @@ def upload_background():
             if not file.content_type.startswith('image/'):
                 return jsonify({'status': 'error', 'message': 'Please select an image file only'})
             
-            # Generate unique filename
-            filename = f"user_bg_{random.randint(1000, 9999)}_{file.filename}"
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+            # Stream to disk under a content-hash name, reusing an identical earlier upload
+            try:
+                filename = save_upload(file, app.config['UPLOAD_FOLDER'], upload_executor)
+            except ValueError:
+                return jsonify({'status': 'error', 'message': 'Please upload a JPG, PNG, GIF or WebP image'})
             
-            # Save file directly
-            file.save(filepath)
+            cleanup_stale_uploads()
             
-            # Update session
-            session['background_settings'] = {
-                'type': 'uploaded',
-                'value': filename,
-                'size': ''
-            }
-            session.modified = True
+            settings = update_session_settings({'background': settings_schema.background_id('uploaded', filename)})
             
             return jsonify({
                 'status': 'success', 
                 'message': 'Background uploaded successfully',
-                'background': session['background_settings']
+                'background': settings_schema.background(settings['background'])
             })
             
     except Exception as e:
@@ -388,7 +976,7 @@ def upload_background():
 @app.route('/toggle-language', methods=['POST'])
 def toggle_language():
     """Toggle between language modes"""
-    current_language = session.get('language', 'english')
+    current_language = get_settings()['language']
     
     # Cycle through language modes
     if current_language == 'english':
@@ -396,8 +984,7 @@ def toggle_language():
     else:
         new_language = 'english'
     
-    session['language'] = new_language
-    session.modified = True
+    update_session_settings({'language': new_language})
     
     # Return language info for UI update
     language_info = {
@@ -420,9 +1007,94 @@ def get_placeholder_text(language):
     }
     return placeholders.get(language, placeholders['english'])
 
+def asset_url(path):
+    """Link to the fingerprinted build of a static asset when there is one"""
+    built = ASSET_MANIFEST.get(path)
+    if built is None:
+        return url_for('static', filename=path)
+    return url_for('serve_asset', filename=built)
+
+@app.context_processor
+def asset_helpers():
+    """Expose asset_url() to templates"""
+    return {'asset_url': asset_url}
+
+@app.route('/assets/<path:filename>')
+def serve_asset(filename):
+    """Serve fingerprinted assets, preferring a precompressed variant the client accepts"""
+    accepted = request.accept_encodings
+    for encoding, suffix in ASSET_ENCODINGS:
+        if accepted[encoding] and os.path.isfile(safe_join(DIST_DIR, filename + suffix) or ''):
+            response = send_from_directory(DIST_DIR, filename + suffix, mimetype=mimetypes.guess_type(filename)[0],
+                                           etag=False, max_age=ASSET_CACHE_MAX_AGE)
+            response.content_encoding = encoding
+            break
+    else:
+        response = send_from_directory(DIST_DIR, filename, etag=False, max_age=ASSET_CACHE_MAX_AGE)
+    
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/cache-stats')
+def cache_stats():
+    """Report search cache, precomputed answer and page cache hit/miss counters"""
+    # Counters are per process, so say which worker answered
+    return jsonify({
+        'worker': os.getpid(),
+        'search_cache': assistant.search_cache.stats(),
+        'precomputed_answers': assistant.answer_table.stats(),
+        'pages': page_cache.stats(),
+        'upstream_quota': assistant.upstream_quota.usage()
+    })
+
+def cleanup_stale_uploads():
+    """Delete unreferenced uploads, at most once per UPLOAD_CLEANUP_INTERVAL"""
+    global last_upload_cleanup
+    now = time.time()
+    if now - last_upload_cleanup < UPLOAD_CLEANUP_INTERVAL:
+        return
+    last_upload_cleanup = now
+    cleanup_uploads(app.config['UPLOAD_FOLDER'], UPLOAD_RETENTION)
+
 @app.route('/static/uploads/<filename>')
 def serve_uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    """Serve uploads, picking a resized variant for the requested viewport width"""
+    upload_dir = app.config['UPLOAD_FOLDER']
+    if content_hash(filename) is None:
+        # Legacy random names aren't immutable, so keep the default revalidation
+        return send_from_directory(upload_dir, filename)
+    
+    touch_upload(upload_dir, filename)
+    width = request.args.get('w', type=int)
+    if width:
+        filename = best_variant(upload_dir, filename, width)
+    
+    response = send_from_directory(upload_dir, filename, etag=False, max_age=UPLOAD_CACHE_MAX_AGE)
+    response.set_etag(os.path.splitext(filename)[0])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+def warm_up():
+    """Touch the lazily initialized paths so a fresh worker's first request isn't slow"""
+    with app.test_request_context('/'):
+        index()
+    assistant.is_kenyan_law_question("What are my rights as a tenant under the Constitution?")
+    assistant.search_local("tenant rights")
+    assistant.search_cache.stats()
+
+def shutdown():
+    """Let in-flight work go and flush state before a worker exits"""
+    search_executor.shutdown(wait=False, cancel_futures=True)
+    batch_executor.shutdown(wait=False, cancel_futures=True)
+    upload_executor.shutdown(wait=False, cancel_futures=True)
+    assistant.search_cache.save()
+    assistant.http_client.close()
+    if request_journal is not None:
+        request_journal.close()
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Development server only; production runs under gunicorn (see gunicorn.conf.py)
+    app.run(debug=os.getenv('FLASK_DEBUG', '0') == '1', host='0.0.0.0', port=int(os.getenv('PORT', '5000')))
\ No newline at end of file
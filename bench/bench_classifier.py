@@ -0,0 +1,77 @@
+"""Compare keyword classifier throughput against the original substring scan.
+
+    python bench/bench_classifier.py --lengths 100 1000 10000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from law_classifier import legal_classifier  # noqa: E402
+
+LEGACY_KEYWORDS = [
+    'kenya', 'kenyan', 'nairobi', 'mombasa', 'kisumu', 'nakuru', 'eldoret',
+    'law', 'legal', 'constitution', 'act', 'statute', 'court', 'judge',
+    'lawyer', 'advocate', 'legal advice', 'rights', 'constitutional',
+    'parliament', 'bill', 'legislation', 'regulation', 'high court',
+    'magistrate', 'supreme court', 'court of appeal', 'law society',
+    'attorney general', 'directorate of public prosecutions',
+    'civil procedure', 'criminal procedure', 'evidence act',
+    'penal code', 'civil code', 'business law', 'company law',
+    'employment act', 'labour law', 'family law', 'marriage act',
+    'children act', 'succession act', 'land act', 'registration act',
+    'rent restriction', 'tenant', 'landlord', 'contract act',
+    'tort', 'negligence', 'defamation', 'libel', 'slander'
+]
+
+FILLER = ("please help me understand what happens when my neighbour keeps asking "
+          "about the weather football prices recipes travel plans and music").split()
+
+
+def legacy_is_kenyan_law_question(question):
+    """The original per-call list rebuild and substring scan"""
+    kenyan_law_keywords = list(LEGACY_KEYWORDS)
+    question_lower = question.lower()
+    return any(keyword in question_lower for keyword in kenyan_law_keywords)
+
+
+def make_message(length, hit):
+    words = [random.choice(FILLER) for _ in range(max(1, length // 6))]
+    if hit:
+        # Put the legal term at the end, the worst case for an early exit
+        words.append('succession act')
+    return " ".join(words)[:length] if not hit else " ".join(words)
+
+
+def bench(func, messages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message in messages:
+            func(message)
+    elapsed = time.perf_counter() - start
+    return len(messages) * repeat / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lengths', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--messages', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(0)
+    print(f"{'length':>8} {'case':>5} {'legacy msg/s':>14} {'compiled msg/s':>15} {'speedup':>8}")
+    for length in args.lengths:
+        for hit in (False, True):
+            messages = [make_message(length, hit) for _ in range(args.messages)]
+            legacy = bench(legacy_is_kenyan_law_question, messages, args.repeat)
+            compiled = bench(legal_classifier.matches, messages, args.repeat)
+            case = 'hit' if hit else 'miss'
+            print(f"{length:>8} {case:>5} {legacy:>14,.0f} {compiled:>15,.0f} {compiled / legacy:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
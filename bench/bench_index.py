@@ -0,0 +1,75 @@
+"""Measure local index build time and query latency as the corpus grows.
+
+    python bench/bench_index.py --sizes 1000 10000 50000
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from law_index import LawIndex, build_index  # noqa: E402
+
+VOCABULARY = [f"term{i}" for i in range(20000)]
+SECTIONS_PER_FILE = 100
+
+
+def zipf_word(rng):
+    # Skewed word frequencies, like real legal text
+    return VOCABULARY[min(int(rng.paretovariate(1.1)) - 1, len(VOCABULARY) - 1)]
+
+
+def write_corpus(corpus_dir, sections, rng):
+    for file_number in range(0, sections, SECTIONS_PER_FILE):
+        path = os.path.join(corpus_dir, f"act_{file_number // SECTIONS_PER_FILE}.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"# Synthetic Act {file_number}\nSource: https://example.invalid/{file_number}\n")
+            for section in range(min(SECTIONS_PER_FILE, sections - file_number)):
+                words = " ".join(zipf_word(rng) for _ in range(rng.randint(40, 200)))
+                f.write(f"## Section {section}\n{words}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000], help='Sections per corpus')
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"{'sections':>9} {'build s':>8} {'open ms':>8} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7}")
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix='law_index_bench_')
+        try:
+            corpus_dir = os.path.join(work_dir, 'corpus')
+            index_dir = os.path.join(work_dir, 'index')
+            os.makedirs(corpus_dir)
+            write_corpus(corpus_dir, size, rng)
+
+            start = time.perf_counter()
+            build_index(corpus_dir, index_dir)
+            build_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            index = LawIndex(index_dir)
+            open_time = (time.perf_counter() - start) * 1000
+
+            queries = [" ".join(zipf_word(rng) for _ in range(rng.randint(2, 8))) for _ in range(args.queries)]
+            latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                index.search(query)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+            cuts = statistics.quantiles(latencies, n=100)
+            print(f"{size:>9} {build_time:>8.2f} {open_time:>8.1f} {cuts[49]:>7.2f} {cuts[94]:>7.2f} {cuts[98]:>7.2f}")
+        finally:
+            shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
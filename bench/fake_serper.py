@@ -0,0 +1,93 @@
+"""Local stand-in for the Serper search API with configurable latency and failures.
+
+Run it and point the app at it:
+
+    python bench/fake_serper.py --port 8099 --latency 0.3 --error-rate 0.1
+    SERPER_API_URL=http://127.0.0.1:8099/search SERPER_API_KEY=test python app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeSerperHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        config = self.server.config
+        self.server.request_count += 1
+
+        delay = config['latency'] + random.uniform(0, config['jitter'])
+        if delay:
+            time.sleep(delay)
+
+        if random.random() < config['error_rate']:
+            self.send_json(config['error_status'], {"message": "Simulated upstream failure"})
+            return
+
+        query = payload.get('q', '')
+        self.send_json(200, {
+            "searchParameters": payload,
+            "organic": [
+                {
+                    "title": f"{query} - Kenya Law result {i}",
+                    "link": f"https://kenyalaw.org/result/{i}",
+                    "snippet": f"Simulated legal source {i} for '{query}'.",
+                }
+                for i in range(1, payload.get('num', 5) + 1)
+            ],
+        })
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_serper(port=0, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503):
+    """Start the stub server on a background thread and return it; its URL is server.url"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), FakeSerperHandler)
+    server.daemon_threads = True
+    server.request_count = 0
+    server.config = {
+        'latency': latency,
+        'jitter': jitter,
+        'error_rate': error_rate,
+        'error_status': error_status,
+    }
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/search"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.0, help='Base response delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random delay in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests that fail')
+    parser.add_argument('--error-status', type=int, default=503)
+    args = parser.parse_args()
+
+    server = start_fake_serper(args.port, args.latency, args.jitter, args.error_rate, args.error_status)
+    print(f"Fake Serper listening on {server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""Load-test the chat service against a local Serper stand-in.
+
+By default this starts the fake Serper server and the app (threaded WSGI
+server, no debugger) in-process, then replays a realistic mix of /chat,
+/set-background and /toggle-language requests at each concurrency level:
+
+    python bench/load_test.py --concurrency 1 8 32 --duration 20
+    python bench/load_test.py --json report.json --baseline last_deploy.json
+
+Use --target to load an already running instance instead (its Serper
+URL is then whatever that instance was started with).
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_serper import start_fake_serper  # noqa: E402
+
+LEGAL_QUESTIONS = [
+    "What are my rights as a tenant in Kenya?",
+    "How does the Employment Act handle unfair dismissal?",
+    "What is the succession process in Kenya?",
+    "How do I register land in Nairobi?",
+    "What does the Constitution say about freedom of expression?",
+    "Can a landlord evict me without notice?",
+    "How long is maternity leave under the Employment Act?",
+    "What is the procedure for filing a case in the High Court?",
+    "Haki za mpangaji ni zipi chini ya sheria?",
+    "Mchakato wa mirathi unafanyaje kazi?",
+]
+OFF_TOPIC_QUESTIONS = [
+    "What's the weather like today?",
+    "Recommend a good football team to support",
+]
+BACKGROUNDS = [
+    {'type': 'solid', 'value': '#ffffff'},
+    {'type': 'gradient', 'value': 'linear-gradient(135deg, #667eea 0%, #764ba2 100%)'},
+    {'type': 'solid', 'value': '#000000'},
+]
+DEFAULT_MIX = {'chat': 0.8, 'set_background': 0.1, 'toggle_language': 0.1}
+
+
+def rss_bytes(pid='self'):
+    """Resident set size of a process from /proc, or None where unavailable"""
+    try:
+        with open(f'/proc/{pid}/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def start_app(serper_url, port=0):
+    """Start the Flask app on a threaded WSGI server in this process and return its base URL"""
+    os.environ['SERPER_API_URL'] = serper_url
+    os.environ.setdefault('SERPER_API_KEY', 'load-test')
+    # Every simulated client shares one IP and chats far faster than a person, so the
+    # per-client limits would turn the run into a test of the fallback answers
+    os.environ.setdefault('CHAT_RATE_PER_SESSION', '0')
+    os.environ.setdefault('CHAT_RATE_PER_IP', '0')
+    # Synthetic traffic must not end up in the request journal that replays and answer tables use
+    os.environ.setdefault('JOURNAL_FILE', '')
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from app import app
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', port, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def make_question(rng, unique_ratio):
+    if rng.random() < 0.1:
+        return rng.choice(OFF_TOPIC_QUESTIONS)
+    question = rng.choice(LEGAL_QUESTIONS)
+    if rng.random() < unique_ratio:
+        # Defeat the caches the way long-tail traffic does
+        question = f"{question} (case {rng.randrange(10 ** 9)})"
+    return question
+
+
+def run_operation(client, base_url, operation, rng, unique_ratio):
+    if operation == 'chat':
+        return client.post(f"{base_url}/chat", json={'message': make_question(rng, unique_ratio)}, timeout=60)
+    if operation == 'set_background':
+        return client.post(f"{base_url}/set-background", json=rng.choice(BACKGROUNDS), timeout=60)
+    return client.post(f"{base_url}/toggle-language", timeout=60)
+
+
+def run_level(base_url, concurrency, duration, mix, unique_ratio, seed):
+    """Run closed-loop clients for `duration` seconds and return per-operation latencies"""
+    operations, weights = zip(*mix.items())
+    deadline = time.monotonic() + duration
+    results = {operation: [] for operation in operations}
+    errors = {operation: 0 for operation in operations}
+    lock = threading.Lock()
+
+    def worker(worker_id):
+        rng = random.Random(seed * 1000 + worker_id)
+        # Each client keeps its own cookies, i.e. its own chat session
+        client = requests.Session()
+        while time.monotonic() < deadline:
+            operation = rng.choices(operations, weights)[0]
+            start = time.perf_counter()
+            try:
+                ok = run_operation(client, base_url, operation, rng, unique_ratio).status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                results[operation].append(elapsed)
+                if not ok:
+                    errors[operation] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors, time.monotonic() - start
+
+
+def percentiles(samples):
+    if len(samples) < 2:
+        value = samples[0] * 1000 if samples else 0.0
+        return value, value, value
+    cuts = statistics.quantiles(samples, n=100)
+    return cuts[49] * 1000, cuts[94] * 1000, cuts[98] * 1000
+
+
+def compare_to_baseline(report, baseline_path, tolerance):
+    """Return descriptions of p95 regressions beyond the tolerance"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {(row['concurrency'], row['operation']): row for row in json.load(f)['results']}
+    regressions = []
+    for row in report['results']:
+        previous = baseline.get((row['concurrency'], row['operation']))
+        if previous and previous['p95_ms'] and row['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(
+                f"{row['operation']} @ {row['concurrency']}: p95 {previous['p95_ms']:.1f} -> {row['p95_ms']:.1f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--target', help='Base URL of a running instance (default: start one in-process)')
+    parser.add_argument('--pid', help='PID of the target process, for memory readings with --target')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--duration', type=float, default=15, help='Seconds per concurrency level')
+    parser.add_argument('--serper-latency', type=float, default=0.3)
+    parser.add_argument('--serper-jitter', type=float, default=0.2)
+    parser.add_argument('--serper-error-rate', type=float, default=0.02)
+    parser.add_argument('--unique-ratio', type=float, default=0.3, help='Share of chat questions made unique')
+    parser.add_argument('--mix', type=json.loads, default=DEFAULT_MIX, help='Operation weights as JSON')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='Write the report to this file')
+    parser.add_argument('--baseline', help='Earlier --json report to compare p95 latency against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 regression vs baseline')
+    args = parser.parse_args()
+
+    serper = None
+    if args.target:
+        base_url = args.target.rstrip('/')
+        pid = args.pid
+    else:
+        serper = start_fake_serper(latency=args.serper_latency, jitter=args.serper_jitter,
+                                   error_rate=args.serper_error_rate)
+        base_url = start_app(serper.url)
+        pid = 'self'
+
+    report = {'target': base_url, 'started': time.time(), 'results': [], 'memory': []}
+    print(f"{'conc':>5} {'operation':>16} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+
+    for level, concurrency in enumerate(args.concurrency):
+        rss_before = rss_bytes(pid) if pid else None
+        results, errors, elapsed = run_level(base_url, concurrency, args.duration, args.mix,
+                                             args.unique_ratio, args.seed + level)
+        rss_after = rss_bytes(pid) if pid else None
+
+        for operation, samples in results.items():
+            p50, p95, p99 = percentiles(samples)
+            row = {
+                'concurrency': concurrency,
+                'operation': operation,
+                'requests': len(samples),
+                'errors': errors[operation],
+                'throughput': len(samples) / elapsed,
+                'p50_ms': p50,
+                'p95_ms': p95,
+                'p99_ms': p99,
+            }
+            report['results'].append(row)
+            print(f"{concurrency:>5} {operation:>16} {row['requests']:>9} {row['errors']:>7} "
+                  f"{row['throughput']:>8.1f} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f}")
+
+        total = sum(len(samples) for samples in results.values())
+        memory = {'concurrency': concurrency, 'rss_before': rss_before, 'rss_after': rss_after}
+        report['memory'].append(memory)
+        if rss_before and rss_after:
+            growth = (rss_after - rss_before) / 1024 / 1024
+            print(f"{concurrency:>5} {'total':>16} {total:>9} {'':>7} {total / elapsed:>8.1f}  "
+                  f"RSS {rss_after / 1024 / 1024:.1f} MiB ({growth:+.1f} MiB)")
+
+    if serper is not None:
+        report['upstream_requests'] = serper.request_count
+        print(f"Upstream Serper requests: {serper.request_count}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        regressions = compare_to_baseline(report, args.baseline, args.tolerance)
+        if regressions:
+            print("p95 regressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No p95 regressions against baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""Summarize a request journal and optionally replay it through the service.
+
+The summary covers where answers came from, latencies, and the
+frequent-query statistics used to size the caches: how many distinct
+questions cover a given share of traffic, and the hit rate an LRU search
+cache of each size would have had on this traffic:
+
+    python bench/replay_journal.py journal/requests.jsonl*
+    python bench/replay_journal.py journal/*.jsonl* --cache-sizes 100 1000 5000 --ttl 3600
+
+Records carry the question text only when the service ran with
+JOURNAL_QUESTIONS=1; --replay sends those questions back through /chat,
+in journal order, against an in-process app and Serper stand-in (or
+--target), and reports the replayed latencies.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from journal import read_journal  # noqa: E402
+from load_test import percentiles, start_app  # noqa: E402
+from fake_serper import start_fake_serper  # noqa: E402
+
+COVERAGE_TARGETS = (0.5, 0.8, 0.9, 0.95)
+
+
+def expand_paths(patterns):
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        paths.extend(matches or [pattern])
+    return paths
+
+
+def size_percentiles(sizes):
+    if not sizes:
+        return 0, 0
+    sizes = sorted(sizes)
+    return sizes[len(sizes) // 2], sizes[min(len(sizes) - 1, int(len(sizes) * 0.95))]
+
+
+def coverage(counts, total):
+    """Distinct questions needed, most frequent first, to cover each target share of requests"""
+    needed = {}
+    covered = 0
+    targets = list(COVERAGE_TARGETS)
+    for distinct, (_, count) in enumerate(counts.most_common(), 1):
+        covered += count
+        while targets and covered >= targets[0] * total:
+            needed[targets.pop(0)] = distinct
+    return needed
+
+
+def simulate_lru(records, size, ttl):
+    """Hit rate an LRU cache of `size` entries with `ttl` seconds would have had on these lookups"""
+    cache = OrderedDict()
+    hits = 0
+    for record in records:
+        key, now = record['question_hash'], record.get('ts', 0)
+        stored = cache.get(key)
+        if stored is not None and (not ttl or now - stored <= ttl):
+            hits += 1
+            cache.move_to_end(key)
+            continue
+        cache[key] = now
+        cache.move_to_end(key)
+        if len(cache) > size:
+            cache.popitem(last=False)
+    return hits / len(records) if records else 0.0
+
+
+def summarize(records, top, cache_sizes, ttl):
+    searched = [record for record in records if record.get('source') == 'search']
+    in_scope = [record for record in records if record.get('in_scope')]
+    counts = Counter(record['question_hash'] for record in in_scope)
+    upstream = [record['upstream_latency'] for record in records if record.get('upstream_latency') is not None]
+    cache_hits = sum(1 for record in searched if record.get('cache_hit'))
+    return {
+        'requests': len(records),
+        'routes': dict(Counter(record.get('route') for record in records)),
+        'in_scope': len(in_scope),
+        'sources': dict(Counter(record.get('source') for record in records)),
+        'search_cache_hit_rate': cache_hits / len(searched) if searched else 0.0,
+        'latency_ms': percentiles([record['latency'] for record in records if 'latency' in record]),
+        'upstream_latency_ms': percentiles(upstream),
+        'response_bytes_p50_p95': size_percentiles([record.get('response_bytes', 0) for record in records]),
+        'distinct_questions': len(counts),
+        'coverage': coverage(counts, len(in_scope)),
+        'top_questions': counts.most_common(top),
+        'lru_hit_rate': {size: simulate_lru(searched, size, ttl) for size in cache_sizes},
+    }
+
+
+def print_summary(summary):
+    print(f"Requests: {summary['requests']}  routes: {summary['routes']}")
+    print(f"In scope: {summary['in_scope']}  answered from: {summary['sources']}")
+    print(f"Search cache hit rate: {summary['search_cache_hit_rate']:.1%}")
+    print("Latency p50/p95/p99 ms: {:.1f} / {:.1f} / {:.1f}".format(*summary['latency_ms']))
+    print("Upstream latency p50/p95/p99 ms: {:.1f} / {:.1f} / {:.1f}".format(*summary['upstream_latency_ms']))
+    print("Response size p50/p95 bytes: {:.0f} / {:.0f}".format(*summary['response_bytes_p50_p95']))
+    print(f"Distinct in-scope questions: {summary['distinct_questions']}")
+    for share, distinct in summary['coverage'].items():
+        print(f"  top {distinct} questions cover {share:.0%} of in-scope requests")
+    print("Simulated LRU search cache hit rate by size:")
+    for size, rate in summary['lru_hit_rate'].items():
+        print(f"  {size:>7} entries: {rate:.1%}")
+    print("Most frequent questions (hash, count):")
+    for key, count in summary['top_questions']:
+        print(f"  {key} {count}")
+
+
+def replay(records, base_url, concurrency):
+    """Send journaled questions to /chat in order and return the replayed latencies in seconds"""
+    questions = [record['question'] for record in records if record.get('question')]
+    latencies = []
+    lock = threading.Lock()
+    position = iter(range(len(questions)))
+
+    def worker():
+        client = requests.Session()
+        for index in position:
+            start = time.perf_counter()
+            try:
+                client.post(f"{base_url}/chat", json={'message': questions[index]}, timeout=60)
+            except requests.RequestException:
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(questions), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='+', help='Journal files or glob patterns (rotated .gz parts included)')
+    parser.add_argument('--top', type=int, default=20, help='How many frequent questions to list')
+    parser.add_argument('--cache-sizes', type=int, nargs='+', default=[100, 500, 1000, 5000])
+    parser.add_argument('--ttl', type=float, default=float(os.getenv('SEARCH_CACHE_TTL', '3600')),
+                        help='Cache TTL in seconds for the LRU simulation (0 for none)')
+    parser.add_argument('--replay', action='store_true', help='Send journaled questions back through /chat')
+    parser.add_argument('--target', help='Base URL of a running instance (default: start one in-process)')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--json', help='Write the summary to this file')
+    args = parser.parse_args()
+
+    records = [record for record in read_journal(expand_paths(args.paths)) if 'question_hash' in record]
+    # Rotated parts and per-worker files interleave in time
+    records.sort(key=lambda record: record.get('ts', 0))
+    summary = summarize(records, args.top, args.cache_sizes, args.ttl)
+    print_summary(summary)
+
+    if args.replay:
+        if args.target:
+            base_url = args.target.rstrip('/')
+        else:
+            # Replays must not add to the journal being read
+            os.environ['JOURNAL_FILE'] = ''
+            os.environ.setdefault('CHAT_RATE_PER_SESSION', '0')
+            os.environ.setdefault('CHAT_RATE_PER_IP', '0')
+            base_url = start_app(start_fake_serper(latency=0.3, jitter=0.2).url)
+        sent, latencies = replay(records, base_url, args.concurrency)
+        summary['replay'] = {'questions': sent, 'completed': len(latencies), 'latency_ms': percentiles(latencies)}
+        if not sent:
+            print("No question text in the journal to replay (run the service with JOURNAL_QUESTIONS=1)")
+        else:
+            print(f"Replayed {len(latencies)}/{sent} questions; "
+                  "latency p50/p95/p99 ms: {:.1f} / {:.1f} / {:.1f}".format(*summary['replay']['latency_ms']))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, default=str)
+
+
+if __name__ == '__main__':
+    main()
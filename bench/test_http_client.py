@@ -0,0 +1,84 @@
+"""Circuit breaker and retry deadline checks for http_client against the Serper stand-in.
+
+    python -m pytest bench/test_http_client.py
+"""
+import os
+import sys
+import time
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_serper import start_fake_serper  # noqa: E402
+from http_client import CircuitBreaker, CircuitOpenError, HTTPClient, RetryBudget  # noqa: E402
+
+
+def make_client(**kwargs):
+    kwargs.setdefault('breaker', CircuitBreaker(failure_threshold=2, reset_timeout=0.2))
+    kwargs.setdefault('retry_budget', RetryBudget(ratio=1, max_tokens=100))
+    kwargs.setdefault('backoff', 0.01)
+    return HTTPClient(**kwargs)
+
+
+def test_breaker_opens_and_recovers():
+    server = start_fake_serper(error_rate=1.0)
+    client = make_client(max_retries=0)
+    for _ in range(2):
+        assert client.post(server.url, json={'q': 'bail'}).status_code == 503
+    assert client.breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        client.post(server.url, json={'q': 'bail'})
+
+    server.config['error_rate'] = 0.0
+    time.sleep(0.25)
+    assert client.post(server.url, json={'q': 'bail'}).status_code == 200
+    assert client.breaker.state == 'closed'
+
+
+def test_unexpected_error_in_half_open_trial_does_not_wedge_breaker():
+    server = start_fake_serper(error_rate=1.0)
+    client = make_client(max_retries=0)
+    for _ in range(2):
+        client.post(server.url, json={'q': 'bail'})
+    time.sleep(0.25)
+
+    post = client.session.post
+
+    def broken_post(*args, **kwargs):
+        raise requests.exceptions.ChunkedEncodingError("Connection broken mid-body")
+
+    client.session.post = broken_post
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        client.post(server.url, json={'q': 'bail'})
+    # The failed trial reopened the circuit instead of leaving the trial slot taken
+    assert client.breaker.state == 'open'
+    assert not client.breaker.trial_in_progress
+
+    client.session.post = post
+    server.config['error_rate'] = 0.0
+    time.sleep(0.25)
+    assert client.post(server.url, json={'q': 'bail'}).status_code == 200
+    assert client.breaker.state == 'closed'
+
+
+def test_retries_stay_within_total_timeout():
+    server = start_fake_serper(latency=0.2, error_rate=1.0)
+    client = make_client(connect_timeout=0.1, total_timeout=0.5, max_retries=5,
+                         breaker=CircuitBreaker(failure_threshold=100))
+    start = time.monotonic()
+    response = client.post(server.url, json={'q': 'bail'})
+    assert response.status_code == 503
+    assert time.monotonic() - start < 0.6
+    # A third attempt would not have had time to complete
+    assert server.request_count == 2
+
+
+def test_read_timeout_is_not_retried():
+    server = start_fake_serper(latency=0.5)
+    client = make_client(read_timeout=0.2, max_retries=2)
+    with pytest.raises(requests.Timeout):
+        client.post(server.url, json={'q': 'bail'})
+    assert server.request_count == 1
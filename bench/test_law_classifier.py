@@ -0,0 +1,38 @@
+"""Keyword classifier checks: whole words only, with plurals and stems.
+
+    python -m pytest bench/test_law_classifier.py
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from law_classifier import legal_classifier  # noqa: E402
+
+
+@pytest.mark.parametrize('question', [
+    "How do I contact my bank?",
+    "What is the best recipe for chapati?",
+    "Can you tell me about the weather in Europe?",
+])
+def test_everyday_questions_are_not_legal(question):
+    assert legal_classifier.matches(question) == []
+
+
+@pytest.mark.parametrize('question', [
+    "Is this an unlawful dismissal?",
+    "How do I file a lawsuit against my employer?",
+    "Is it legally required to have a written contract?",
+    "Was the eviction unconstitutional?",
+    "Is it illegal to keep my deposit?",
+    "What does the Employment Act say about leave?",
+    "My landlords refuse to return my deposit",
+])
+def test_legal_questions_match(question):
+    assert legal_classifier.matches(question)
+
+
+def test_phrases_and_stems_report_their_terms():
+    assert legal_classifier.matches("Appeal at the High Court, legally") == ['high court', 'legal']
@@ -0,0 +1,78 @@
+"""Rate limiter and upstream quota checks with an injected clock.
+
+    python -m pytest bench/test_rate_limit.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('JOURNAL_FILE', '')
+
+from fake_serper import start_fake_serper  # noqa: E402
+from http_client import CircuitBreaker, HTTPClient  # noqa: E402
+from rate_limit import RateLimiter, UpstreamQuota  # noqa: E402
+from shared_state import MemoryState  # noqa: E402
+
+# 2026-01-31 12:00 UTC
+NOON = 1769860800.0
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_rate_limiter_bursts_then_refills():
+    clock = Clock(NOON)
+    limiter = RateLimiter(MemoryState(), 'session', rate=6, burst=2, clock=clock)
+    assert limiter.allow('a')[0] and limiter.allow('a')[0]
+    allowed, retry_after = limiter.allow('a')
+    assert not allowed and retry_after == 10
+    # Keys are limited independently
+    assert limiter.allow('b')[0]
+    clock.now += 10
+    assert limiter.allow('a')[0]
+
+
+def test_quota_stops_at_budget_and_resets_with_the_period():
+    clock = Clock(NOON)
+    quota = UpstreamQuota(MemoryState(), daily=2, monthly=3, clock=clock)
+    assert quota.acquire() and quota.acquire()
+    assert not quota.acquire()
+    assert quota.usage()['daily_used'] == 2
+
+    clock.now += 86400  # February: new day and new month
+    assert quota.acquire()
+    quota.release()
+    assert quota.usage() == {'daily_used': 0, 'daily_budget': 2, 'monthly_used': 0, 'monthly_budget': 3}
+
+
+def test_open_breaker_spends_no_tokens_or_quota():
+    import app
+
+    server = start_fake_serper()
+    clock = Clock(NOON)
+    state = MemoryState()
+    quota = UpstreamQuota(state, daily=100, monthly=1000, clock=clock)
+    limiter = RateLimiter(state, 'session', rate=60, burst=5, clock=clock)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    assistant = app.KenyanLawAssistant(http_client=HTTPClient(breaker=breaker), upstream_quota=quota)
+
+    original_url = app.SERPER_API_URL
+    app.SERPER_API_URL = server.url
+    try:
+        for _ in range(5):
+            result = assistant.fetch_search_results({'q': 'tenant rights'}, lambda: limiter.allow('s')[0])
+            assert result.get('transient')
+    finally:
+        app.SERPER_API_URL = original_url
+
+    assert server.request_count == 0
+    assert quota.usage()['daily_used'] == 0 and quota.usage()['monthly_used'] == 0
+    assert all(limiter.allow('s')[0] for _ in range(5))
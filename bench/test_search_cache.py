@@ -0,0 +1,74 @@
+"""Coalescing and failure handling checks for search_cache.
+
+    python -m pytest bench/test_search_cache.py
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_cache import SearchCache, SharedSearchCache  # noqa: E402
+from shared_state import MemoryState  # noqa: E402
+
+
+class LockedState(MemoryState):
+    """State backend whose writes fail, like SQLite reporting "database is locked" """
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        raise RuntimeError("database is locked")
+
+    def count(self, prefix=''):
+        return 0
+
+
+def test_failed_store_still_answers_and_releases_waiters():
+    cache = SharedSearchCache(LockedState())
+    started = threading.Event()
+
+    def slow_fetch():
+        started.set()
+        time.sleep(0.2)
+        return {"organic": [1]}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_fetch('k', slow_fetch)))
+    leader.start()
+    started.wait()
+    waiter = threading.Thread(target=lambda: results.append(cache.get_or_fetch('k', slow_fetch)))
+    waiter.start()
+    leader.join(2)
+    waiter.join(2)
+
+    assert not leader.is_alive() and not waiter.is_alive()
+    assert results == [{"organic": [1]}, {"organic": [1]}]
+    assert cache.inflight == {}
+    assert cache.stats()['store_errors'] == 1
+    # The key isn't stuck: a later caller fetches again
+    assert cache.get_or_fetch('k', lambda: {"organic": [2]}) == {"organic": [2]}
+
+
+def test_waiters_retry_after_transient_refusal():
+    cache = SearchCache()
+    started = threading.Event()
+
+    def refused():
+        started.set()
+        time.sleep(0.2)
+        return {"error": "Search rate limit reached", "transient": True}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_fetch('k', refused)))
+    leader.start()
+    started.wait()
+    waiter = threading.Thread(target=lambda: results.append(cache.get_or_fetch('k', lambda: {"organic": [1]})))
+    waiter.start()
+    leader.join(2)
+    waiter.join(2)
+
+    assert {"organic": [1]} in results
+    assert cache.get('k') == {"organic": [1]}
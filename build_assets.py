@@ -0,0 +1,117 @@
+"""Minify, fingerprint and precompress static assets.
+
+Writes content-hashed copies of the CSS, JS and background images to
+static/dist along with .gz (and .br, if the brotli package is installed)
+variants and a manifest.json that the asset_url() template helper reads:
+
+    python build_assets.py
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip variants are always built
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_FILE = os.path.join(DIST_DIR, 'manifest.json')
+
+ASSETS = ['css/style.css', 'js/script.js', 'img', 'backgrounds']
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json')
+# Compression only pays off above a few hundred bytes
+MIN_COMPRESS_SIZE = 512
+
+
+def minify_css(source):
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.DOTALL)
+    source = re.sub(r'\s+', ' ', source)
+    # Spaces before ':' are kept since they matter in selectors ("a :hover")
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    source = re.sub(r':\s+', ':', source)
+    return source.replace(';}', '}').strip()
+
+
+def minify_js(source):
+    """Conservative minification: drop indentation, blank lines and whole-line comments"""
+    lines = []
+    for line in source.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith('//'):
+            continue
+        lines.append(stripped)
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def iter_sources(assets=ASSETS):
+    for asset in assets:
+        path = os.path.join(STATIC_DIR, asset)
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if os.path.isfile(os.path.join(path, name)):
+                    yield f"{asset}/{name}"
+        elif os.path.isfile(path):
+            yield asset
+
+
+def build_asset(rel_path):
+    """Write the fingerprinted (and precompressed) copy of one asset, returning its dist path"""
+    with open(os.path.join(STATIC_DIR, rel_path), 'rb') as f:
+        data = f.read()
+
+    base, extension = os.path.splitext(rel_path)
+    minifier = MINIFIERS.get(extension)
+    if minifier:
+        data = minifier(data.decode('utf-8')).encode('utf-8')
+
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    dist_path = f"{base}.{digest}{extension}"
+    out_path = os.path.join(DIST_DIR, dist_path)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path, 'wb') as f:
+        f.write(data)
+
+    if extension in COMPRESSIBLE and len(data) >= MIN_COMPRESS_SIZE:
+        with open(out_path + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(out_path + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+    return dist_path
+
+
+def build_assets():
+    """Rebuild static/dist from scratch and write the manifest"""
+    shutil.rmtree(DIST_DIR, ignore_errors=True)
+    os.makedirs(DIST_DIR)
+    manifest = {rel_path: build_asset(rel_path) for rel_path in iter_sources()}
+    with open(MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(path=MANIFEST_FILE):
+    """Return the source -> fingerprinted path mapping, or {} if assets haven't been built"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+if __name__ == '__main__':
+    manifest = build_assets()
+    for source, built in manifest.items():
+        original = os.path.getsize(os.path.join(STATIC_DIR, source))
+        size = os.path.getsize(os.path.join(DIST_DIR, built))
+        gz_path = os.path.join(DIST_DIR, built + '.gz')
+        gz = f", {os.path.getsize(gz_path):,} gzip" if os.path.exists(gz_path) else ''
+        print(f"{source} -> dist/{built} ({original:,} -> {size:,} bytes{gz})")
@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from shared_state import SQLiteConnections, state_backend, state_db_path
+
+
+class MemoryConversationStore:
+    """In-memory per-session conversation history with LRU/TTL eviction"""
+
+    def __init__(self, max_turns=20, max_sessions=5000, ttl=3600, shards=16):
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self.shard_capacity = max(1, max_sessions // shards)
+        # Each shard has its own lock so sessions never contend on a global one
+        self.shards = [(OrderedDict(), threading.Lock()) for _ in range(shards)]
+
+    def _shard(self, session_id):
+        return self.shards[hash(session_id) % len(self.shards)]
+
+    def _history(self, session_id, create):
+        sessions, lock = self._shard(session_id)
+        now = time.monotonic()
+        with lock:
+            entry = sessions.get(session_id)
+            if entry is not None and now - entry[0] > self.ttl:
+                del sessions[session_id]
+                entry = None
+            if entry is None:
+                if not create:
+                    return None
+                entry = [now, deque(maxlen=self.max_turns)]
+                sessions[session_id] = entry
+                # Evict least recently used sessions beyond the shard capacity
+                while len(sessions) > self.shard_capacity:
+                    sessions.popitem(last=False)
+            else:
+                entry[0] = now
+                sessions.move_to_end(session_id)
+            return entry[1]
+
+    def append(self, session_id, role, content):
+        """Append a message, dropping the oldest once max_turns is reached"""
+        self._history(session_id, create=True).append({"role": role, "content": content})
+
+    def get(self, session_id):
+        """Return the session's messages, oldest first"""
+        history = self._history(session_id, create=False)
+        return list(history) if history is not None else []
+
+    def clear(self, session_id):
+        """Forget a single session's history"""
+        sessions, lock = self._shard(session_id)
+        with lock:
+            sessions.pop(session_id, None)
+
+    def __len__(self):
+        return sum(len(sessions) for sessions, _ in self.shards)
+
+
+class SQLiteConversationStore(SQLiteConnections):
+    """On-disk per-session conversation history backed by SQLite"""
+
+    # Expired messages are deleted on every Nth append
+    PURGE_EVERY = 500
+
+    def __init__(self, path, max_turns=20, ttl=3600):
+        super().__init__(path)
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self.appends = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " session_id TEXT NOT NULL,"
+                " role TEXT NOT NULL,"
+                " content TEXT NOT NULL,"
+                " created REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id)")
+
+    def append(self, session_id, role, content):
+        """Append a message and trim the session to max_turns"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO messages (session_id, role, content, created) VALUES (?, ?, ?, ?)",
+                (session_id, role, content, now),
+            )
+            conn.execute(
+                "DELETE FROM messages WHERE session_id = ? AND id NOT IN ("
+                " SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                (session_id, session_id, self.max_turns),
+            )
+        self.appends += 1
+        if self.appends % self.PURGE_EVERY == 0:
+            self.purge_expired()
+
+    def get(self, session_id):
+        """Return the session's unexpired messages, oldest first"""
+        rows = self._connect().execute(
+            "SELECT role, content FROM messages WHERE session_id = ? AND created > ? ORDER BY id",
+            (session_id, time.time() - self.ttl),
+        ).fetchall()
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def clear(self, session_id):
+        """Forget a single session's history"""
+        self._connect().execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+
+    def purge_expired(self):
+        """Delete messages older than the TTL"""
+        self._connect().execute("DELETE FROM messages WHERE created <= ?", (time.time() - self.ttl,))
+
+
+def create_conversation_store():
+    """Build the conversation store selected by the CONVERSATION_STORE env var"""
+    backend = os.getenv('CONVERSATION_STORE', state_backend())
+    max_turns = int(os.getenv('CONVERSATION_MAX_TURNS', '20'))
+    ttl = int(os.getenv('CONVERSATION_TTL', '3600'))
+
+    if backend == 'sqlite':
+        path = os.getenv('CONVERSATION_DB', state_db_path())
+        return SQLiteConversationStore(path, max_turns=max_turns, ttl=ttl)
+
+    max_sessions = int(os.getenv('CONVERSATION_MAX_SESSIONS', '5000'))
+    return MemoryConversationStore(max_turns=max_turns, max_sessions=max_sessions, ttl=ttl)
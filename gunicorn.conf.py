@@ -0,0 +1,51 @@
+"""Gunicorn settings for running Juahaki with several worker processes.
+
+Every value can be overridden from the environment, e.g. on Render:
+
+    WEB_CONCURRENCY=4 GUNICORN_THREADS=8 gunicorn -c gunicorn.conf.py wsgi:app
+
+Workers share the search cache and conversation history through the
+SQLite state file (STATE_DB); point it at /dev/shm to keep it in memory.
+"""
+import itertools
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', str(min(multiprocessing.cpu_count() * 2 + 1, 8))))
+# Requests mostly wait on Serper, so threads per worker keep the CPUs busy
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '20'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+# Recycle workers now and then so slow leaks can't accumulate
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '5000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '500'))
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+
+# The app is imported in each worker, not the master: its thread pool and
+# refresher thread would not survive the fork
+preload_app = False
+
+
+def pre_fork(server, worker):
+    # Number workers by the lowest free slot, so a recycled worker's replacement
+    # takes over its per-worker files (the request journal) instead of adding new ones
+    taken = {getattr(other, 'slot', None) for other in server.WORKERS.values()}
+    worker.slot = next(slot for slot in itertools.count() if slot not in taken)
+
+
+def post_fork(server, worker):
+    os.environ['WORKER_SLOT'] = str(worker.slot)
+
+
+def post_worker_init(worker):
+    from app import warm_up
+    warm_up()
+
+
+def worker_exit(server, worker):
+    from app import shutdown
+    shutdown()
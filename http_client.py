@@ -0,0 +1,178 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit breaker is rejecting calls to an unhealthy upstream"""
+
+
+class RetryBudget:
+    """Token bucket that caps retries to a fraction of overall request volume"""
+
+    def __init__(self, ratio=0.2, max_tokens=10):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.lock = threading.Lock()
+
+    def deposit(self):
+        """Earn a fraction of a retry for every request made"""
+        with self.lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self):
+        """Spend one retry, returning False if the budget is exhausted"""
+        with self.lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class CircuitBreaker:
+    """Stops calling an upstream after repeated failures until it recovers"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        """Return True if a call may go through now"""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            # Half-open: let a single trial call probe the upstream
+            if self.trial_in_progress:
+                return False
+            self.trial_in_progress = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_progress = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_progress or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_progress = False
+
+
+class HTTPClient:
+    """Pooled keep-alive HTTP client with jittered retries and a circuit breaker"""
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, connect_timeout=3.05, read_timeout=5, total_timeout=10, max_retries=2, backoff=0.2,
+                 pool_size=20, retry_budget=None, breaker=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.total_timeout = total_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.retry_budget = retry_budget if retry_budget is not None else RetryBudget()
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+
+        # A single session reuses TCP/TLS connections across requests and threads
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def post(self, url, **kwargs):
+        """POST with retries inside total_timeout, raising CircuitOpenError while the upstream is unhealthy"""
+        if not self.breaker.allow():
+            raise CircuitOpenError("Upstream circuit is open")
+
+        self.retry_budget.deposit()
+        deadline = time.monotonic() + self.total_timeout
+        try:
+            response = self._post_with_retries(url, deadline, kwargs)
+        except BaseException:
+            # Every exit must settle the breaker, or a half-open trial that raised
+            # something unexpected would leave it rejecting calls for good
+            self.breaker.record_failure()
+            raise
+        if response.status_code in self.RETRY_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def _post_with_retries(self, url, deadline, kwargs):
+        timeout = kwargs.pop('timeout', self.timeout)
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        attempt = 0
+        while True:
+            remaining = max(deadline - time.monotonic(), 0.001)
+            kwargs['timeout'] = (min(connect_timeout, remaining), min(read_timeout, remaining))
+            try:
+                response = self.session.post(url, **kwargs)
+            except requests.ConnectionError:
+                # Includes connect timeouts; a read timeout is not retried, since an
+                # upstream that is already slow would only be waited on again
+                delay = self._retry_delay(attempt, deadline, connect_timeout)
+                if delay is None:
+                    raise
+            else:
+                if response.status_code not in self.RETRY_STATUSES:
+                    return response
+                delay = self._retry_delay(attempt, deadline, connect_timeout)
+                if delay is None:
+                    return response
+
+            attempt += 1
+            time.sleep(delay)
+
+    def _retry_delay(self, attempt, deadline, connect_timeout):
+        """Seconds to wait before retrying, or None if the attempt shouldn't be retried"""
+        if attempt >= self.max_retries:
+            return None
+        # Full jitter keeps retries from synchronising across workers
+        delay = random.uniform(0, self.backoff * (2 ** (attempt + 1)))
+        # Only retry while there is still time left to at least connect
+        if time.monotonic() + delay + connect_timeout > deadline:
+            return None
+        if not self.retry_budget.withdraw():
+            return None
+        return delay
+
+    def close(self):
+        self.session.close()
+
+
+def create_http_client():
+    """Build the shared upstream HTTP client from HTTP_* env vars"""
+    return HTTPClient(
+        connect_timeout=float(os.getenv('HTTP_CONNECT_TIMEOUT', '3.05')),
+        read_timeout=float(os.getenv('HTTP_READ_TIMEOUT', '5')),
+        total_timeout=float(os.getenv('HTTP_TOTAL_TIMEOUT', '10')),
+        max_retries=int(os.getenv('HTTP_MAX_RETRIES', '2')),
+        pool_size=int(os.getenv('HTTP_POOL_SIZE', '20')),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv('HTTP_BREAKER_THRESHOLD', '5')),
+            reset_timeout=float(os.getenv('HTTP_BREAKER_RESET', '30')),
+        ),
+    )
@@ -0,0 +1,189 @@
+"""Append-only journal of chat requests, written off the request path.
+
+Each record is one JSON line: question hash, language, whether it was in
+scope, where the answer came from, upstream latency, cache hit and
+response size. Records are queued and written in batches by a background
+thread; the file rotates by size, optionally gzip-compressing old parts.
+Replay a journal and get frequent-query statistics with
+bench/replay_journal.py.
+"""
+import contextlib
+import contextvars
+import gzip
+import hashlib
+import json
+import os
+import queue
+import shutil
+import threading
+
+# The record being built for the current request, filled in along the answer path
+_trace = contextvars.ContextVar('journal_trace', default=None)
+
+
+def question_hash(question):
+    """Stable hash of a question, normalized the same way as search cache keys"""
+    normalized = " ".join(question.lower().split())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:16]
+
+
+@contextlib.contextmanager
+def tracing(trace):
+    """Collect note() calls made in this context (and contexts copied from it) into trace"""
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+
+def note(**fields):
+    """Add fields to the current request's journal record, if one is being built"""
+    trace = _trace.get()
+    if trace is not None:
+        trace.update(fields)
+
+
+class RequestJournal:
+    """Buffered JSON-lines writer with size-based rotation
+
+    record() never blocks: when the queue is full the record is dropped
+    and counted instead.
+    """
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, backups=5, compress=True,
+                 flush_interval=1.0, queue_size=10000, batch_bytes=64 * 1024):
+        # "{worker}" in the path gives each worker process its own file: the gunicorn worker
+        # slot (see gunicorn.conf.py), which a recycled worker's replacement reuses, else the pid
+        self.path = path.format(worker=os.getenv('WORKER_SLOT') or os.getpid())
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.compress = compress
+        self.flush_interval = flush_interval
+        self.batch_bytes = batch_bytes
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.counters = {'written': 0, 'dropped': 0, 'rotations': 0, 'errors': 0}
+        self.lock = threading.Lock()
+        self.thread = None
+        self.file = None
+
+    def record(self, entry):
+        """Queue a record for writing"""
+        if self.thread is None:
+            self._start()
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            with self.lock:
+                self.counters['dropped'] += 1
+
+    def _start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='request-journal', daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                entry = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if entry is None:
+                return
+
+            # Drain whatever else is waiting, so one write covers many records
+            lines = [json.dumps(entry, separators=(',', ':'))]
+            size = len(lines[0])
+            closing = False
+            while size < self.batch_bytes:
+                try:
+                    entry = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is None:
+                    closing = True
+                    break
+                lines.append(json.dumps(entry, separators=(',', ':')))
+                size += len(lines[-1])
+            self._write(lines)
+            if closing:
+                return
+
+    def _write(self, lines):
+        try:
+            if self.file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self.file = open(self.path, 'a', encoding='utf-8')
+            self.file.write("\n".join(lines) + "\n")
+            self.file.flush()
+            with self.lock:
+                self.counters['written'] += len(lines)
+            if self.file.tell() >= self.max_bytes:
+                self._rotate()
+        except OSError:
+            with self.lock:
+                self.counters['errors'] += 1
+
+    def _rotate(self):
+        """Shift path -> path.1[.gz] -> path.2[.gz] ..., dropping the oldest"""
+        self.file.close()
+        self.file = None
+        suffix = '.gz' if self.compress else ''
+        for number in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{number}{suffix}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{number + 1}{suffix}")
+        if self.compress:
+            with open(self.path, 'rb') as source, gzip.open(f"{self.path}.1.gz", 'wb') as target:
+                shutil.copyfileobj(source, target)
+            os.remove(self.path)
+        else:
+            os.replace(self.path, f"{self.path}.1")
+        with self.lock:
+            self.counters['rotations'] += 1
+
+    def close(self, timeout=5):
+        """Write out queued records and stop the writer thread"""
+        if self.thread is not None:
+            try:
+                self.queue.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+            self.thread.join(timeout)
+            self.thread = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, queued=self.queue.qsize())
+
+
+def read_journal(paths):
+    """Yield records from journal files, reading rotated .gz parts transparently"""
+    for path in paths:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def create_request_journal():
+    """Build the journal from JOURNAL_* env vars, or return None if JOURNAL_FILE is empty"""
+    path = os.getenv('JOURNAL_FILE', os.path.join('journal', 'requests.jsonl'))
+    if not path:
+        return None
+    return RequestJournal(
+        path,
+        max_bytes=int(os.getenv('JOURNAL_MAX_BYTES', str(50 * 1024 * 1024))),
+        backups=int(os.getenv('JOURNAL_BACKUPS', '5')),
+        compress=os.getenv('JOURNAL_COMPRESS', '1') == '1',
+    )
@@ -0,0 +1,97 @@
+import os
+import string
+from itertools import compress
+
+KEYWORDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'legal_keywords.txt')
+
+# Punctuation is turned into spaces so str.split() yields whole words
+PUNCTUATION_TABLE = str.maketrans({char: ' ' for char in string.punctuation + '\u2018\u2019\u201c\u201d\u2013\u2014'})
+
+
+def load_keywords(path=KEYWORDS_FILE):
+    """Read one keyword per line, skipping blank lines and # comments"""
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = (line.strip().lower() for line in f)
+        return [" ".join(line.split()) for line in lines if line and not line.startswith('#')]
+
+
+class KeywordClassifier:
+    """Whole-word keyword matcher built once from a term list
+
+    Text is split into whole words in one pass, so 'act' never
+    matches inside 'contact'. Each word is normalized through a lookup
+    table (accepting plural "s"/"es" forms), and multi-word terms are
+    found by checking the phrases that start with each known word. A
+    single-word term ending in "*" is a stem matching any word it
+    starts ('legal*' covers 'legally' and 'legality').
+    """
+
+    def __init__(self, terms):
+        self.terms = sorted(set(terms))
+        # First word -> candidate phrases (as word tuples), longest first
+        self.phrases = {}
+        # Surface form -> base vocabulary word
+        self.forms = {}
+        stems = []
+
+        for term in self.terms:
+            if term.endswith('*'):
+                stem = term[:-1]
+                stems.append(stem)
+                self.phrases.setdefault(stem, []).append((stem,))
+                continue
+            words = tuple(term.split())
+            self.phrases.setdefault(words[0], []).append(words)
+            for word in words:
+                self.forms[word] = word
+        for word in list(self.forms):
+            for suffix in ('s', 'es'):
+                self.forms.setdefault(word + suffix, word)
+        for candidates in self.phrases.values():
+            candidates.sort(key=len, reverse=True)
+        # Longest first, so the most specific stem names the match
+        self.stems = tuple(sorted(stems, key=len, reverse=True))
+        # Substrings that any word starting with a stem must contain, for a quick check that
+        # lets most texts skip the per-word stem lookups ('lawful' already covers 'unlawful')
+        self.stem_probes = tuple(stem for stem in self.stems
+                                 if not any(other != stem and other in stem for other in self.stems))
+
+    @classmethod
+    def from_file(cls, path=KEYWORDS_FILE):
+        return cls(load_keywords(path))
+
+    def matches(self, text):
+        """Return the distinct keywords found in text, in order of first appearance"""
+        text = text.lower().translate(PUNCTUATION_TABLE)
+        tokens = text.split()
+        has_stem = any(probe in text for probe in self.stem_probes)
+        # Fast path: no token is part of any keyword
+        if not has_stem and self.forms.keys().isdisjoint(tokens):
+            return []
+
+        words = list(map(self.forms.get, tokens))
+        if has_stem:
+            words = [word or self.stem(token) for word, token in zip(words, tokens)]
+        found = []
+        skip_until = 0
+        for i in compress(range(len(words)), words):
+            if i < skip_until:
+                continue
+            for phrase in self.phrases.get(words[i], ()):
+                if tuple(words[i:i + len(phrase)]) == phrase:
+                    term = " ".join(phrase)
+                    if term not in found:
+                        found.append(term)
+                    # Don't also report the words inside a longer match ('court' in 'high court')
+                    skip_until = i + len(phrase)
+                    break
+        return found
+
+    def stem(self, token):
+        """The stem term that token starts with, or None"""
+        if not token.startswith(self.stems):
+            return None
+        return next(stem for stem in self.stems if token.startswith(stem))
+
+
+legal_classifier = KeywordClassifier.from_file()
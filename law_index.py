@@ -0,0 +1,331 @@
+"""Offline BM25 index over a corpus of Kenyan statutes.
+
+Corpus layout: one UTF-8 .txt/.md file per instrument. The first line is
+the instrument's title (e.g. "# Employment Act, 2007"), an optional
+"Source: <url>" line gives its official link, and each "## " heading
+starts a new section (e.g. "## Section 10 - Employment particulars").
+Every section becomes one searchable document.
+
+    python law_index.py build --corpus corpus --index index
+    python law_index.py query --index index "notice period for termination"
+"""
+import argparse
+import array
+import bisect
+import heapq
+import json
+import math
+import mmap
+import os
+import shutil
+import sys
+import time
+
+from law_classifier import PUNCTUATION_TABLE
+
+INDEX_VERSION = 1
+# Each build writes a new generation directory; CURRENT names the live one
+GENERATION_PREFIX = 'gen-'
+GENERATIONS_KEPT = 2
+# Question words plus terms every in-scope question shares ('kenya', 'law')
+STOPWORDS = frozenset("""
+a about also am an and any are as at be by can do does for from get has have
+how i if in into is it kenya kenyan law laws long many me much my need not of
+on or our should than that the their then there this to under was we what
+when where which who will with you your
+""".split())
+SNIPPET_LENGTH = 300
+
+
+def tokenize(text):
+    """Lowercase words with punctuation and stopwords removed"""
+    return [word for word in text.lower().translate(PUNCTUATION_TABLE).split() if word not in STOPWORDS]
+
+
+def parse_corpus_file(path):
+    """Split an instrument file into section documents"""
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+
+    instrument = os.path.splitext(os.path.basename(path))[0].replace('_', ' ')
+    source = ''
+    sections = []
+    heading, body = None, []
+
+    for index, line in enumerate(lines):
+        stripped = line.strip()
+        if index == 0 and stripped.startswith('# '):
+            instrument = stripped[2:].strip()
+        elif stripped.lower().startswith('source:') and not sections and heading is None:
+            source = stripped.split(':', 1)[1].strip()
+        elif stripped.startswith('## '):
+            if heading is not None or any(body):
+                sections.append((heading, body))
+            heading, body = stripped[3:].strip(), []
+        else:
+            body.append(line)
+    if heading is not None or any(body):
+        sections.append((heading, body))
+
+    docs = []
+    for heading, body in sections:
+        text = " ".join(" ".join(body).split())
+        if not text:
+            continue
+        title = f"{instrument} - {heading}" if heading else instrument
+        tokens = tokenize(f"{title} {text}")
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        docs.append({
+            'title': title,
+            'link': source,
+            'snippet': text if len(text) <= SNIPPET_LENGTH else text[:SNIPPET_LENGTH].rsplit(' ', 1)[0] + '...',
+            'length': len(tokens),
+            'counts': counts,
+        })
+    return docs
+
+
+def index_files_dir(index_dir):
+    """Directory holding the live index files: the generation named by CURRENT, else index_dir itself"""
+    try:
+        with open(os.path.join(index_dir, 'CURRENT'), 'r', encoding='utf-8') as f:
+            return os.path.join(index_dir, f.read().strip())
+    except OSError:
+        # Indexes built before generations kept their files directly in index_dir
+        return index_dir
+
+
+def prune_generations(index_dir, keep):
+    """Delete all but the newest `keep` generation directories"""
+    generations = sorted(name for name in os.listdir(index_dir) if name.startswith(GENERATION_PREFIX))
+    for name in generations[:-keep]:
+        shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+
+
+def build_index(corpus_dir, index_dir, verbose=False):
+    """Build or incrementally refresh the index, re-parsing only changed corpus files"""
+    os.makedirs(index_dir, exist_ok=True)
+    cache_path = os.path.join(index_dir, 'files.json')
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        if cache.get('version') != INDEX_VERSION:
+            cache = {}
+    except (OSError, ValueError):
+        cache = {}
+    cached_files = cache.get('files', {})
+
+    files = {}
+    reparsed = 0
+    for root, _, names in os.walk(corpus_dir):
+        for name in sorted(names):
+            if not name.endswith(('.txt', '.md')):
+                continue
+            path = os.path.join(root, name)
+            rel_path = os.path.relpath(path, corpus_dir)
+            stat = os.stat(path)
+            fingerprint = [stat.st_mtime_ns, stat.st_size]
+            entry = cached_files.get(rel_path)
+            if entry is None or entry['fingerprint'] != fingerprint:
+                entry = {'fingerprint': fingerprint, 'docs': parse_corpus_file(path)}
+                reparsed += 1
+            files[rel_path] = entry
+
+    changed = reparsed or set(files) != set(cached_files)
+    if not changed and os.path.exists(os.path.join(index_files_dir(index_dir), 'meta.json')):
+        if verbose:
+            print("Index is up to date")
+        return False
+
+    # Assign doc IDs and invert
+    docs = [doc for rel_path in sorted(files) for doc in files[rel_path]['docs']]
+    postings = {}
+    for doc_id, doc in enumerate(docs):
+        for term, count in doc['counts'].items():
+            postings.setdefault(term, []).append((doc_id, min(count, 0xFFFF)))
+
+    generation = f"{GENERATION_PREFIX}{time.time_ns()}"
+    generation_dir = os.path.join(index_dir, generation)
+    os.makedirs(generation_dir)
+
+    # Doc IDs and term frequencies live in parallel arrays so doc IDs can be binary searched
+    lexicon = {}
+    posting_docs = array.array('I')
+    posting_tfs = array.array('H')
+    for term in sorted(postings):
+        lexicon[term] = [len(posting_docs), len(postings[term])]
+        for doc_id, count in postings[term]:
+            posting_docs.append(doc_id)
+            posting_tfs.append(count)
+    with open(os.path.join(generation_dir, 'postings.bin'), 'wb') as f:
+        posting_docs.tofile(f)
+    with open(os.path.join(generation_dir, 'tfs.bin'), 'wb') as f:
+        posting_tfs.tofile(f)
+
+    doc_offsets = array.array('Q')
+    with open(os.path.join(generation_dir, 'docs.bin'), 'wb') as f:
+        position = 0
+        for doc in docs:
+            data = json.dumps({'title': doc['title'], 'link': doc['link'], 'snippet': doc['snippet']}).encode('utf-8')
+            doc_offsets.append(position)
+            f.write(data)
+            position += len(data)
+        doc_offsets.append(position)
+    with open(os.path.join(generation_dir, 'docs.idx'), 'wb') as f:
+        doc_offsets.tofile(f)
+
+    lengths = array.array('I', (doc['length'] for doc in docs))
+    with open(os.path.join(generation_dir, 'lengths.bin'), 'wb') as f:
+        lengths.tofile(f)
+
+    total_length = sum(lengths)
+    meta = {
+        'version': INDEX_VERSION,
+        'doc_count': len(docs),
+        'avg_length': total_length / len(docs) if docs else 0,
+        'lexicon': lexicon,
+    }
+    with open(os.path.join(generation_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+    # Switch CURRENT to the new generation with one atomic rename, so a reader opens either
+    # the old index or the new one and never a mix of files from both
+    pointer_path = os.path.join(index_dir, 'CURRENT')
+    with open(pointer_path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(generation)
+    os.replace(pointer_path + '.tmp', pointer_path)
+    # The previous generation stays for readers that read CURRENT just before the switch;
+    # older ones can go, as open indexes keep their memory maps after the files are removed
+    prune_generations(index_dir, GENERATIONS_KEPT)
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': INDEX_VERSION, 'files': files}, f)
+
+    if verbose:
+        print(f"Indexed {len(docs)} sections from {len(files)} files ({reparsed} re-parsed), {len(lexicon)} terms")
+    return True
+
+
+class LawIndex:
+    """Read-only, memory-mapped BM25 index produced by build_index"""
+
+    def __init__(self, index_dir, k1=1.2, b=0.75):
+        self.index_dir = index_dir
+        self.files_dir = index_files_dir(index_dir)
+        self.k1 = k1
+        self.b = b
+        with open(os.path.join(self.files_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported index version in {index_dir}")
+
+        self.doc_count = meta['doc_count']
+        self.avg_length = meta['avg_length'] or 1
+        self.lexicon = meta['lexicon']
+        self.posting_docs = self._map('postings.bin', 'I')
+        self.posting_tfs = self._map('tfs.bin', 'H')
+        self.doc_offsets = self._map('docs.idx', 'Q')
+        self.lengths = self._map('lengths.bin', 'I')
+        self.docs = self._map('docs.bin')
+
+    def _map(self, name, typecode=None):
+        with open(os.path.join(self.files_dir, name), 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return memoryview(b'').cast(typecode or 'B')
+            view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            return view.cast(typecode) if typecode else view
+
+    def idf(self, term):
+        entry = self.lexicon.get(term)
+        df = entry[1] if entry else 0
+        return math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+
+    def document(self, doc_id):
+        start, end = self.doc_offsets[doc_id], self.doc_offsets[doc_id + 1]
+        return json.loads(bytes(self.docs[start:end]).decode('utf-8'))
+
+    def search(self, query, top_k=3):
+        """Return [(score, coverage, doc)] for the best matching sections
+
+        score is the BM25 score divided by the most this query could score
+        (every term saturated), so it falls in [0, 1) whatever the corpus;
+        a section with each query term once at average length scores
+        1 / (k1 + 1), about 0.45. coverage is the share of the query's IDF
+        weight that the section contains. Callers use both to decide whether
+        the answer is confident enough to skip a web search.
+        """
+        terms = set(tokenize(query))
+        if not terms or not self.doc_count:
+            return []
+
+        scores = {}
+        matched = {}
+        total_weight = sum(self.idf(term) for term in terms)
+
+        # Rarest terms first: they pick the candidates, common terms only re-rank them
+        known = sorted((self.lexicon[term][1], term) for term in terms if term in self.lexicon)
+        for count, term in known:
+            idf = self.idf(term)
+            offset = self.lexicon[term][0]
+            docs = self.posting_docs[offset:offset + count]
+            tfs = self.posting_tfs[offset:offset + count]
+
+            if scores and count > 4 * len(scores):
+                # Look up the existing candidates instead of walking a long posting list
+                hits = []
+                for doc_id in list(scores):
+                    i = bisect.bisect_left(docs, doc_id)
+                    if i < count and docs[i] == doc_id:
+                        hits.append((doc_id, tfs[i]))
+            else:
+                hits = zip(docs, tfs)
+
+            for doc_id, tf in hits:
+                norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / self.avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+                matched[doc_id] = matched.get(doc_id, 0.0) + idf
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        max_score = total_weight * (self.k1 + 1)
+        return [(score / max_score, matched[doc_id] / total_weight, self.document(doc_id)) for doc_id, score in best]
+
+
+def load_law_index(index_dir=None):
+    """Open the index named by LOCAL_INDEX_DIR, or return None if it hasn't been built"""
+    index_dir = index_dir or os.getenv('LOCAL_INDEX_DIR', 'index')
+    if not os.path.exists(os.path.join(index_files_dir(index_dir), 'meta.json')):
+        return None
+    return LawIndex(index_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Build or incrementally refresh the index')
+    build_parser.add_argument('--corpus', default='corpus')
+    build_parser.add_argument('--index', default='index')
+
+    query_parser = subparsers.add_parser('query', help='Run a query against the index')
+    query_parser.add_argument('--index', default='index')
+    query_parser.add_argument('--top', type=int, default=3)
+    query_parser.add_argument('query')
+
+    args = parser.parse_args()
+    if args.command == 'build':
+        build_index(args.corpus, args.index, verbose=True)
+    else:
+        index = load_law_index(args.index)
+        if index is None:
+            sys.exit(f"No index found in {args.index}; run 'python law_index.py build' first")
+        start = time.perf_counter()
+        results = index.search(args.query, args.top)
+        elapsed = (time.perf_counter() - start) * 1000
+        for score, coverage, doc in results:
+            print(f"{score:5.2f}  {coverage:4.0%}  {doc['title']}")
+        print(f"{len(results)} results in {elapsed:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""Lightweight in-process metrics rendered in the Prometheus text format.
+
+Metrics are plain counters and fixed-bucket histograms guarded by a lock
+each, so recording costs a dict lookup and a few additions. Every process
+keeps its own registry, so each sample carries a worker="<pid>" label;
+sum over that label (sum without (worker) (rate(...))) for service totals.
+"""
+import functools
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as StackCounter
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self, const_labels=()):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        names = tuple(pair[0] for pair in const_labels) + self.labels
+        const_values = tuple(pair[1] for pair in const_labels)
+        with self.lock:
+            items = sorted(self.values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_format_labels(names, const_values + label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(label_values)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                series = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self, const_labels=()):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        names = tuple(pair[0] for pair in const_labels) + self.labels
+        const_values = tuple(pair[1] for pair in const_labels)
+        with self.lock:
+            items = sorted((key, [list(series[0]), series[1], series[2]]) for key, series in self.values.items())
+        for label_values, (counts, total, count) in items:
+            label_values = const_values + label_values
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                labels = _format_labels(names + ('le',), label_values + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(names, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name, documentation, labels=()):
+        metric = Counter(name, documentation, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """Register a callable returning [(name, type, documentation, {label tuple: value})] at scrape time"""
+        self.collectors.append(collector)
+
+    def render(self):
+        # Read at render time, so a registry inherited across a fork reports the right process
+        const_labels = (('worker', os.getpid()),)
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render(const_labels))
+        for collector in self.collectors:
+            for name, metric_type, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for label_pairs, value in samples.items():
+                    label_pairs = const_labels + tuple(label_pairs)
+                    names = tuple(pair[0] for pair in label_pairs)
+                    values = tuple(pair[1] for pair in label_pairs)
+                    lines.append(f"{name}{_format_labels(names, values)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram(
+    'juahaki_stage_seconds', 'Time spent in each chat pipeline stage', labels=('stage',))
+request_seconds = registry.histogram(
+    'juahaki_request_seconds', 'HTTP request latency by route', labels=('method', 'route', 'status'))
+upstream_responses = registry.counter(
+    'juahaki_upstream_responses_total', 'Serper responses by HTTP status', labels=('status',))
+upstream_errors = registry.counter(
+    'juahaki_upstream_errors_total', 'Serper calls that failed without a response', labels=('reason',))
+rate_limited = registry.counter(
+    'juahaki_rate_limited_total', 'Chat requests answered without a web search because a limit was hit', labels=('limit',))
+requests_shed = registry.counter(
+    'juahaki_requests_shed_total', 'Requests rejected with 429 by admission control', labels=('route',))
+
+
+def timed(stage):
+    """Decorator recording a function's wall time under juahaki_stage_seconds{stage=...}"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stage_seconds.observe(time.perf_counter() - start, stage)
+        return wrapper
+    return decorator
+
+
+def timed_stream(stage):
+    """Like timed, for generator functions: records the time until the generator finishes or is closed"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                yield from func(*args, **kwargs)
+            finally:
+                stage_seconds.observe(time.perf_counter() - start, stage)
+        return wrapper
+    return decorator
+
+
+def sample_stacks(seconds=5.0, interval=0.01, ignore_thread=None):
+    """Sample every thread's stack for a while and return collapsed stacks with counts
+
+    The output is one "frame;frame;frame count" line per distinct stack,
+    the input format used by flame graph tools.
+    """
+    ignore_thread = ignore_thread or threading.get_ident()
+    stacks = StackCounter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == ignore_thread:
+                continue
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            stacks[";".join(reversed(frames))] += 1
+        time.sleep(interval)
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
@@ -0,0 +1,70 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class PageCache:
+    """Rendered responses keyed by the inputs they depend on, with strong ETags
+
+    `version` returns something that changes whenever any cached response
+    would (template mtimes, option digests); it is checked at most every
+    check_interval seconds and a change drops every entry.
+    """
+
+    def __init__(self, version, max_entries=256, check_interval=1.0, on_invalidate=None):
+        self.version = version
+        self.max_entries = max_entries
+        self.check_interval = check_interval
+        self.on_invalidate = on_invalidate
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.current_version = None
+        self.checked_at = 0.0
+        self.counters = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self.checked_at < self.check_interval:
+            return
+        self.checked_at = now
+        version = self.version()
+        if version == self.current_version:
+            return
+        with self.lock:
+            if self.current_version is not None:
+                self.counters['invalidations'] += 1
+            self.current_version = version
+            self.entries.clear()
+        if self.on_invalidate is not None:
+            self.on_invalidate()
+
+    def get_or_render(self, key, render):
+        """Return (etag, body bytes) for key, rendering on a miss"""
+        self._check_version()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return entry
+            self.counters['misses'] += 1
+
+        # Concurrent misses for one key may both render; the results are identical
+        body = render()
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        entry = (hashlib.sha256(body).hexdigest()[:20], body)
+        with self.lock:
+            self.entries[key] = entry
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, size=len(self.entries))
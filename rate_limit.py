@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+
+from shared_state import get_state
+
+
+class RateLimiter:
+    """Token bucket per key (session ID, client IP): `rate` requests per minute with bursts of `burst`"""
+
+    def __init__(self, state, name, rate, burst, clock=time.time):
+        self.state = state
+        self.prefix = f"rate:{name}:"
+        self.rate = rate / 60.0
+        self.burst = burst
+        self.clock = clock
+
+    def allow(self, key):
+        """Return (allowed, retry_after seconds); a rate of 0 disables the limit"""
+        if self.rate <= 0:
+            return True, 0.0
+        return self.state.take_token(self.prefix + key, self.rate, self.burst, now=self.clock())
+
+
+class UpstreamQuota:
+    """Daily and monthly budgets for paid upstream searches, counted across all workers
+
+    A budget of 0 means unlimited; usage is still counted for /metrics.
+    """
+
+    def __init__(self, state, daily=0, monthly=0, clock=time.time):
+        self.state = state
+        self.daily = daily
+        self.monthly = monthly
+        self.clock = clock
+
+    def keys(self, now):
+        # UTC periods, matching how the upstream provider bills
+        return time.strftime('quota:day:%Y-%m-%d', time.gmtime(now)), time.strftime('quota:month:%Y-%m', time.gmtime(now))
+
+    def usage(self):
+        now = self.clock()
+        day_key, month_key = self.keys(now)
+        return {
+            'daily_used': self.state.counter(day_key, now=now),
+            'daily_budget': self.daily,
+            'monthly_used': self.state.counter(month_key, now=now),
+            'monthly_budget': self.monthly,
+        }
+
+    def acquire(self):
+        """Count one upstream call, or return False without counting if a budget is spent"""
+        now = self.clock()
+        day_key, month_key = self.keys(now)
+        # Once spent, stay read-only rather than counting up and back down on every call
+        if (self.daily and self.state.counter(day_key, now=now) >= self.daily) or \
+                (self.monthly and self.state.counter(month_key, now=now) >= self.monthly):
+            return False
+        # Counters outlive their period a little so the rollover never resets one early
+        used_today = self.state.incr(day_key, ttl=2 * 86400, now=now)
+        used_this_month = self.state.incr(month_key, ttl=32 * 86400, now=now)
+        if (self.daily and used_today > self.daily) or (self.monthly and used_this_month > self.monthly):
+            self.release(now)
+            return False
+        return True
+
+    def release(self, now=None):
+        """Give back a call counted by acquire() that never reached the upstream"""
+        now = self.clock() if now is None else now
+        day_key, month_key = self.keys(now)
+        self.state.incr(day_key, -1, now=now)
+        self.state.incr(month_key, -1, now=now)
+
+
+class AdmissionControl:
+    """Caps requests in flight in this process, rejecting the excess instead of queueing it"""
+
+    def __init__(self, max_in_flight):
+        self.max_in_flight = max_in_flight
+        self.slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight > 0 else None
+
+    def try_enter(self):
+        return self.slots is None or self.slots.acquire(blocking=False)
+
+    def leave(self):
+        if self.slots is not None:
+            self.slots.release()
+
+
+def create_rate_limiters():
+    """Build the per-session and per-IP chat limiters from CHAT_RATE_* env vars"""
+    state = get_state()
+    return (
+        RateLimiter(state, 'session', float(os.getenv('CHAT_RATE_PER_SESSION', '10')),
+                    int(os.getenv('CHAT_BURST_PER_SESSION', '5'))),
+        RateLimiter(state, 'ip', float(os.getenv('CHAT_RATE_PER_IP', '30')),
+                    int(os.getenv('CHAT_BURST_PER_IP', '20'))),
+    )
+
+
+def create_batch_limiter():
+    """Build the per-IP /chat/batch limiter from CHAT_BATCH_* env vars; a whole batch costs one token"""
+    return RateLimiter(get_state(), 'batch', float(os.getenv('CHAT_BATCH_RATE_PER_IP', '6')),
+                       int(os.getenv('CHAT_BATCH_BURST_PER_IP', '3')))
+
+
+def create_upstream_quota():
+    """Build the upstream search budget from SERPER_DAILY_BUDGET / SERPER_MONTHLY_BUDGET"""
+    return UpstreamQuota(
+        get_state(),
+        daily=int(os.getenv('SERPER_DAILY_BUDGET', '0')),
+        monthly=int(os.getenv('SERPER_MONTHLY_BUDGET', '0')),
+    )
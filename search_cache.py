@@ -0,0 +1,231 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from shared_state import get_shared_state, state_backend
+
+logger = logging.getLogger(__name__)
+
+
+class SearchCache:
+    """TTL + LRU cache for search results with single-flight request coalescing"""
+
+    def __init__(self, ttl=3600, negative_ttl=60, max_entries=1000, path=None, save_interval=30):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.path = path
+        self.save_interval = save_interval
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.last_saved = time.time()
+        self.dirty = False
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'coalesced': 0, 'negative_hits': 0,
+                         'store_errors': 0}
+
+        if self.path:
+            self.load()
+            atexit.register(self.save)
+
+    @staticmethod
+    def make_key(query, gl, hl, num):
+        """Build a cache key from the normalized query and search parameters"""
+        normalized = " ".join(query.lower().split())
+        return f"{gl}|{hl}|{num}|{normalized}"
+
+    def _lookup(self, key, now):
+        # Must be called with the lock held
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= now:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, value, now):
+        # Must be called with the lock held
+        ttl = self.negative_ttl if "error" in value else self.ttl
+        self.entries[key] = (now + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.counters['evictions'] += 1
+        self.dirty = True
+
+    def _cached(self, key):
+        """Return the unexpired (expires, value) entry for key, or None"""
+        with self.lock:
+            return self._lookup(key, time.time())
+
+    def _save(self, key, value):
+        with self.lock:
+            self._store(key, value, time.time())
+
+    def get(self, key):
+        """Return a cached value or None"""
+        entry = self._cached(key)
+        return entry[1] if entry else None
+
+    def get_or_fetch(self, key, fetch):
+        """Return the cached value for key, calling fetch() at most once across concurrent callers"""
+        while True:
+            entry = self._cached(key)
+            with self.lock:
+                if entry is not None:
+                    self.counters['hits'] += 1
+                    if "error" in entry[1]:
+                        self.counters['negative_hits'] += 1
+                    return entry[1]
+
+                flight = self.inflight.get(key)
+                if flight is None:
+                    flight = {'event': threading.Event(), 'value': None}
+                    self.inflight[key] = flight
+                    self.counters['misses'] += 1
+                    break
+                self.counters['coalesced'] += 1
+
+            flight['event'].wait()
+            # A transient refusal (e.g. the leader's rate limit) applies to the leader, not to
+            # this caller, so try again with our own fetch rather than sharing it
+            if not flight['value'].get("transient"):
+                return flight['value']
+
+        # Waiters retry on a transient value, which is what they get if fetch() is interrupted
+        value = {"error": "Search interrupted", "transient": True}
+        try:
+            try:
+                value = fetch()
+            except Exception as e:
+                value = {"error": f"Search failed: {str(e)}"}
+
+            # Transient errors (e.g. an open circuit breaker) are returned but not cached
+            if not value.get("transient"):
+                try:
+                    self._save(key, value)
+                except Exception:
+                    # A failed write-through still answers this caller and its waiters
+                    logger.exception("Could not store search result in the cache")
+                    with self.lock:
+                        self.counters['store_errors'] += 1
+        finally:
+            # Always release the waiters, or they would block on this key forever
+            with self.lock:
+                flight['value'] = value
+                del self.inflight[key]
+            flight['event'].set()
+
+        if self.path and time.time() - self.last_saved >= self.save_interval:
+            self.save()
+        return value
+
+    def stats(self):
+        """Return hit/miss/eviction counters and the current size"""
+        with self.lock:
+            return dict(self.counters, size=len(self.entries))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.dirty = True
+
+    def load(self):
+        """Load unexpired entries from the persistence file"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        now = time.time()
+        with self.lock:
+            for key, expires, value in data.get('entries', []):
+                if expires > now:
+                    self.entries[key] = (expires, value)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def save(self):
+        """Atomically write the cache to the persistence file"""
+        if not self.path:
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            entries = [[key, expires, value] for key, (expires, value) in self.entries.items()]
+            self.dirty = False
+            self.last_saved = time.time()
+
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'entries': entries}, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            self.dirty = True
+
+
+class SharedSearchCache(SearchCache):
+    """SearchCache whose entries live in the cross-process SQLite state
+
+    Coalescing and the hit/miss counters stay per process; the cached
+    results are shared by every worker. State reads and writes happen
+    outside self.lock, which only guards the per-process bookkeeping.
+    """
+
+    PREFIX = 'search:'
+    EVICT_EVERY = 50
+
+    def __init__(self, state, ttl=3600, negative_ttl=60, max_entries=1000):
+        super().__init__(ttl=ttl, negative_ttl=negative_ttl, max_entries=max_entries)
+        self.state = state
+        self.stores = 0
+
+    def _cached(self, key):
+        value = self.state.get(self.PREFIX + key)
+        return (None, value) if value is not None else None
+
+    def _save(self, key, value):
+        ttl = self.negative_ttl if "error" in value else self.ttl
+        self.state.set(self.PREFIX + key, value, ttl)
+        # Trimming to size is a range delete, so only do it periodically
+        with self.lock:
+            self.stores += 1
+            evict = self.stores % self.EVICT_EVERY == 0
+        if evict:
+            evicted = self.state.evict(self.PREFIX, self.max_entries)
+            with self.lock:
+                self.counters['evictions'] += evicted
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+        return dict(counters, size=self.state.count(self.PREFIX))
+
+    def clear(self):
+        self.state.delete_prefix(self.PREFIX)
+
+
+def create_search_cache():
+    """Build the search cache from SEARCH_CACHE_* env vars"""
+    ttl = int(os.getenv('SEARCH_CACHE_TTL', '3600'))
+    negative_ttl = int(os.getenv('SEARCH_CACHE_NEGATIVE_TTL', '60'))
+    max_entries = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', '1000'))
+
+    if os.getenv('SEARCH_CACHE_BACKEND', state_backend()) == 'sqlite':
+        return SharedSearchCache(get_shared_state(), ttl=ttl, negative_ttl=negative_ttl, max_entries=max_entries)
+
+    return SearchCache(
+        ttl=ttl,
+        negative_ttl=negative_ttl,
+        max_entries=max_entries,
+        path=os.getenv('SEARCH_CACHE_FILE') or None,
+    )
@@ -0,0 +1,158 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from shared_state import get_shared_state, state_backend
+from uploads import CONTENT_NAME_RE
+
+UPLOAD_PREFIX = 'upload:'
+HEX_COLOR_RE = re.compile(r'^#[0-9a-fA-F]{6}$')
+FONT_FAMILIES = ('Inter', 'Roboto', 'Open Sans', 'Montserrat', 'Arial')
+FONT_SIZES = range(14, 23)
+
+DEFAULT_SETTINGS = {
+    'background': 'solid_white',
+    'language': 'english',
+    'font_family': 'Inter',
+    'font_size': '16px',
+    'primary_color': '#10a37f',
+    'theme': 'light',
+}
+
+
+class SettingsSchema:
+    """Validation rules for per-session settings, with backgrounds limited to the offered presets
+
+    A background is stored as its preset ID (e.g. "gradient_ocean") or as
+    "upload:<content-hash name>", never as raw CSS.
+    """
+
+    def __init__(self, background_options):
+        self.presets = {option['id']: option for group in background_options.values() for option in group}
+        self.preset_ids = {(option['type'], option['value']): option['id'] for option in self.presets.values()}
+        self.validators = {
+            'background': self.validate_background,
+            'language': lambda value: value if value in ('english', 'swahili') else None,
+            'font_family': lambda value: value if value in FONT_FAMILIES else None,
+            'font_size': self.validate_font_size,
+            'primary_color': lambda value: value.lower() if isinstance(value, str) and HEX_COLOR_RE.match(value) else None,
+            'theme': lambda value: value if value in ('light', 'dark') else None,
+        }
+
+    def validate(self, key, value):
+        """Return the normalized value for a setting, raising ValueError if it isn't allowed"""
+        validator = self.validators.get(key)
+        normalized = validator(value) if validator else None
+        if normalized is None:
+            raise ValueError(f"Invalid setting: {key}")
+        return normalized
+
+    def validate_font_size(self, value):
+        size = str(value).removesuffix('px')
+        return f"{size}px" if size.isdigit() and int(size) in FONT_SIZES else None
+
+    def validate_background(self, value):
+        if not isinstance(value, str):
+            return None
+        if value in self.presets:
+            return value
+        if value.startswith(UPLOAD_PREFIX):
+            match = CONTENT_NAME_RE.match(value[len(UPLOAD_PREFIX):])
+            # Only originals; resized variants are picked when serving
+            return value if match and match.group(2) is None else None
+        return None
+
+    def background_id(self, bg_type, bg_value):
+        """Map a (type, value) pair sent by the client to its stored background ID"""
+        if bg_type == 'uploaded':
+            return self.validate('background', f"{UPLOAD_PREFIX}{bg_value}")
+        preset_id = self.preset_ids.get((bg_type, bg_value))
+        if preset_id is None:
+            raise ValueError("Unknown background")
+        return preset_id
+
+    def background(self, background_id):
+        """Expand a stored background ID into the type/value/size the page renders"""
+        if background_id.startswith(UPLOAD_PREFIX):
+            return {'type': 'uploaded', 'value': background_id[len(UPLOAD_PREFIX):], 'size': ''}
+        option = self.presets.get(background_id) or self.presets[DEFAULT_SETTINGS['background']]
+        return {'type': option['type'], 'value': option['value'], 'size': option.get('size', '')}
+
+
+class MemorySettingsStore:
+    """In-process per-session settings holding only the values that differ from the defaults
+
+    The TTL counts from the session's last read or write, so settings in
+    use never expire.
+    """
+
+    def __init__(self, max_sessions=20000, ttl=30 * 24 * 3600):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _load(self, session_id):
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            now = time.monotonic()
+            if entry is None or now - entry[0] > self.ttl:
+                return {}
+            self.sessions[session_id] = (now, entry[1])
+            self.sessions.move_to_end(session_id)
+            return dict(entry[1])
+
+    def _save(self, session_id, overrides):
+        with self.lock:
+            self.sessions[session_id] = (time.monotonic(), overrides)
+            self.sessions.move_to_end(session_id)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+    def get(self, session_id):
+        """Return the session's full settings, defaults filled in"""
+        return dict(DEFAULT_SETTINGS, **self._load(session_id))
+
+    def update(self, session_id, changes):
+        """Apply already validated changes and return the resulting settings"""
+        overrides = self._load(session_id)
+        for key, value in changes.items():
+            if value == DEFAULT_SETTINGS[key]:
+                overrides.pop(key, None)
+            else:
+                overrides[key] = value
+        self._save(session_id, overrides)
+        return dict(DEFAULT_SETTINGS, **overrides)
+
+    def __len__(self):
+        return len(self.sessions)
+
+
+class SharedSettingsStore(MemorySettingsStore):
+    """Per-session settings kept in the cross-process SQLite state"""
+
+    PREFIX = 'settings:'
+
+    def __init__(self, state, ttl=30 * 24 * 3600):
+        self.state = state
+        self.ttl = ttl
+
+    def _load(self, session_id):
+        return self.state.get(self.PREFIX + session_id, ttl=self.ttl) or {}
+
+    def _save(self, session_id, overrides):
+        self.state.set(self.PREFIX + session_id, overrides, self.ttl)
+
+    def __len__(self):
+        return self.state.count(self.PREFIX)
+
+
+def create_settings_store():
+    """Build the settings store selected by SETTINGS_STORE (defaults to STATE_BACKEND)"""
+    ttl = int(os.getenv('SETTINGS_TTL', str(30 * 24 * 3600)))
+    if os.getenv('SETTINGS_STORE', state_backend()) == 'sqlite':
+        return SharedSettingsStore(get_shared_state(), ttl=ttl)
+    max_sessions = int(os.getenv('SETTINGS_MAX_SESSIONS', '20000'))
+    return MemorySettingsStore(max_sessions=max_sessions, ttl=ttl)
@@ -0,0 +1,255 @@
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Sorts after any key sharing the prefix, for prefix range scans
+PREFIX_END = '\uffff'
+USED_RESOLUTION = 30
+# Idle token buckets are full again long before this, so they can be dropped
+BUCKET_IDLE = 3600
+BUCKET_PRUNE_EVERY = 1000
+# Expired rows under every prefix (settings included) are swept on every Nth write
+EXPIRED_PURGE_EVERY = 500
+
+
+def refill_bucket(tokens, updated, now, rate, burst):
+    """Tokens in a bucket holding `burst` at most and refilling at `rate` per second"""
+    return min(burst, tokens + max(0.0, now - updated) * rate)
+
+
+def take_from_bucket(tokens, cost, rate):
+    """Return (allowed, tokens left, seconds until cost tokens are available)"""
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    return False, tokens, (cost - tokens) / rate
+
+
+class MemoryState:
+    """Counters and token buckets for a single process, with the same interface as SQLiteState"""
+
+    def __init__(self):
+        self.counters = {}
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.takes = 0
+
+    def incr(self, key, amount=1, ttl=None, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            value, expires = self.counters.get(key, (0, None))
+            if expires is not None and expires <= now:
+                value, expires = 0, None
+            if expires is None and ttl:
+                expires = now + ttl
+            value += amount
+            self.counters[key] = (value, expires)
+            return value
+
+    def counter(self, key, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            value, expires = self.counters.get(key, (0, None))
+            return 0 if expires is not None and expires <= now else value
+
+    def take_token(self, key, rate, burst, cost=1, now=None):
+        """Take cost tokens from a bucket if it has them; return (allowed, retry_after seconds)"""
+        now = time.time() if now is None else now
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (burst, now))
+            allowed, tokens, retry_after = take_from_bucket(refill_bucket(tokens, updated, now, rate, burst), cost, rate)
+            self.buckets[key] = (tokens, now)
+            self.takes += 1
+            if self.takes % BUCKET_PRUNE_EVERY == 0:
+                self.buckets = {k: v for k, v in self.buckets.items() if now - v[1] < BUCKET_IDLE}
+        return allowed, retry_after
+
+
+class SQLiteConnections:
+    """Base for SQLite-backed stores: one autocommit WAL connection per thread and process"""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        # Connections must not be inherited across fork, so children start with fresh ones
+        os.register_at_fork(after_in_child=self._reset_connections)
+
+    def _reset_connections(self):
+        self.local = threading.local()
+
+    def _connect(self):
+        # SQLite connections cannot be shared across threads, so keep one per thread
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Run the block's statements as one write transaction, rolled back if it raises"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class SQLiteState(SQLiteConnections):
+    """Key/value store with expiry and atomic counters, shared by every worker process
+
+    Point STATE_DB at a tmpfs path (e.g. /dev/shm/juahaki.db) to keep it in
+    shared memory rather than on disk.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS kv_used ON kv (used)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters ("
+                " key TEXT PRIMARY KEY, value REAL NOT NULL, expires REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+        self.takes = 0
+        self.writes = 0
+
+    def get(self, key, ttl=None):
+        """Return the stored value, or None if missing or expired
+
+        With ttl, a hit also pushes the expiry back to ttl seconds from now
+        (sliding expiration).
+        """
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute("SELECT value, used FROM kv WHERE key = ? AND expires > ?", (key, now)).fetchone()
+        if row is None:
+            return None
+        # Recency (and a sliding expiry) only needs to be approximate, so avoid a write on every hit
+        if now - row[1] > USED_RESOLUTION:
+            if ttl is None:
+                conn.execute("UPDATE kv SET used = ? WHERE key = ?", (now, key))
+            else:
+                conn.execute("UPDATE kv SET used = ?, expires = ? WHERE key = ?", (now, now + ttl, key))
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires, used) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now + ttl, now),
+        )
+        self.writes += 1
+        if self.writes % EXPIRED_PURGE_EVERY == 0:
+            self.purge_expired(now)
+
+    def purge_expired(self, now=None):
+        """Delete expired kv entries and counters, whatever their prefix"""
+        now = time.time() if now is None else now
+        conn = self._connect()
+        conn.execute("DELETE FROM kv WHERE expires <= ?", (now,))
+        conn.execute("DELETE FROM counters WHERE expires <= ?", (now,))
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def delete_prefix(self, prefix):
+        self._connect().execute("DELETE FROM kv WHERE key >= ? AND key < ?", (prefix, prefix + PREFIX_END))
+
+    def count(self, prefix=''):
+        row = self._connect().execute(
+            "SELECT COUNT(*) FROM kv WHERE key >= ? AND key < ? AND expires > ?",
+            (prefix, prefix + PREFIX_END, time.time()),
+        ).fetchone()
+        return row[0]
+
+    def evict(self, prefix, max_entries):
+        """Drop expired entries, then the least recently used beyond max_entries; return how many LRU entries went"""
+        conn = self._connect()
+        upper = prefix + PREFIX_END
+        conn.execute("DELETE FROM kv WHERE key >= ? AND key < ? AND expires <= ?", (prefix, upper, time.time()))
+        cursor = conn.execute(
+            "DELETE FROM kv WHERE key IN ("
+            " SELECT key FROM kv WHERE key >= ? AND key < ? ORDER BY used DESC LIMIT -1 OFFSET ?)",
+            (prefix, upper, max_entries),
+        )
+        return cursor.rowcount
+
+    def incr(self, key, amount=1, ttl=None, now=None):
+        """Atomically add to a counter and return its new value; an expired counter restarts from zero"""
+        now = time.time() if now is None else now
+        expires = now + ttl if ttl else None
+        with self._transaction() as conn:
+            row = conn.execute("SELECT value, expires FROM counters WHERE key = ?", (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                value = amount
+                conn.execute(
+                    "INSERT OR REPLACE INTO counters (key, value, expires) VALUES (?, ?, ?)", (key, value, expires)
+                )
+            else:
+                value = row[0] + amount
+                conn.execute("UPDATE counters SET value = ? WHERE key = ?", (value, key))
+        return value
+
+    def counter(self, key, now=None):
+        now = time.time() if now is None else now
+        row = self._connect().execute(
+            "SELECT value FROM counters WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, now)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def take_token(self, key, rate, burst, cost=1, now=None):
+        """Atomically take cost tokens from a bucket if it has them; return (allowed, retry_after seconds)"""
+        now = time.time() if now is None else now
+        with self._transaction() as conn:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            allowed, tokens, retry_after = take_from_bucket(refill_bucket(tokens, updated, now, rate, burst), cost, rate)
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now))
+            self.takes += 1
+            if self.takes % BUCKET_PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM buckets WHERE updated < ?", (now - BUCKET_IDLE,))
+        return allowed, retry_after
+
+
+def state_backend():
+    """The shared state backend selected by STATE_BACKEND ('memory' or 'sqlite')"""
+    return os.getenv('STATE_BACKEND', 'memory')
+
+
+def state_db_path():
+    return os.getenv('STATE_DB', 'juahaki_state.db')
+
+
+_shared_state = None
+_shared_state_lock = threading.Lock()
+_memory_state = MemoryState()
+
+
+def get_shared_state():
+    """Return the process-wide SQLiteState for STATE_DB"""
+    global _shared_state
+    with _shared_state_lock:
+        if _shared_state is None:
+            _shared_state = SQLiteState(state_db_path())
+        return _shared_state
+
+
+def get_state():
+    """Counter and bucket state for the configured backend: per process, or shared via SQLite"""
+    return get_shared_state() if state_backend() == 'sqlite' else _memory_state
@@ -157,7 +157,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const typingIndicator = addTypingIndicator();
 
         try {
-            const response = await fetch('/chat', {
+            const response = await fetch('/chat/stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -165,17 +165,75 @@ document.addEventListener('DOMContentLoaded', function() {
                 body: JSON.stringify({ message: message })
             });
 
-            const data = await response.json();
-            
-            // Remove typing indicator
+            // Errors such as a 429 when the service is busy come back as JSON, not an event stream
+            if (!response.ok) {
+                let errorMessage = 'Sorry, something went wrong. Please try again.';
+                try {
+                    const data = await response.json();
+                    if (data.message) errorMessage = data.message;
+                } catch (parseError) {
+                    // Keep the generic message
+                }
+                removeTypingIndicator(typingIndicator);
+                addMessage(errorMessage, 'bot');
+                return;
+            }
+
+            // Render the answer incrementally as server-sent events arrive
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            const parts = { header: '', disclaimer: '', sources: [], message: null };
+            let botMessage = null;
+            let buffer = '';
+
+            const render = () => {
+                const content = parts.message !== null
+                    ? parts.message
+                    : [parts.header, parts.sources.join('\n'), parts.disclaimer].filter(Boolean).join('\n\n');
+                if (!botMessage) {
+                    removeTypingIndicator(typingIndicator);
+                    botMessage = addMessage(content, 'bot');
+                } else {
+                    updateMessage(botMessage, content);
+                }
+            };
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const frame = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+
+                    let event = 'message';
+                    let data = '';
+                    frame.split('\n').forEach(line => {
+                        if (line.startsWith('event: ')) event = line.slice(7);
+                        else if (line.startsWith('data: ')) data += line.slice(6);
+                    });
+                    const text = data ? JSON.parse(data) : '';
+
+                    if (event === 'header' || event === 'disclaimer') {
+                        parts[event] = text;
+                    } else if (event === 'source') {
+                        parts.sources.push(text);
+                    } else if (event === 'message' || event === 'fallback') {
+                        parts.message = text;
+                    } else {
+                        continue;
+                    }
+                    render();
+                }
+            }
+
             removeTypingIndicator(typingIndicator);
             
-            // Add bot response
-            addMessage(data.response, 'bot');
-            
             // Auto-read if voice is enabled
-            if (voiceEnabled) {
-                speakText(data.response);
+            if (voiceEnabled && botMessage) {
+                speakText(botMessage.dataset.content);
             }
             
         } catch (error) {
@@ -184,6 +242,22 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    function formatMessageContent(content) {
+        // Format message with line breaks and basic markdown
+        return content
+            .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>')
+            .replace(/\n/g, '<br>');
+    }
+
+    function updateMessage(messageDiv, content) {
+        messageDiv.dataset.content = content;
+        messageDiv.querySelector('.message-content').innerHTML = formatMessageContent(content);
+        chatMessages.scrollTo({
+            top: chatMessages.scrollHeight,
+            behavior: 'smooth'
+        });
+    }
+
     function addMessage(content, sender) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message ${sender}-message`;
@@ -195,12 +269,8 @@ document.addEventListener('DOMContentLoaded', function() {
         const contentDiv = document.createElement('div');
         contentDiv.className = 'message-content';
         
-        // Format message with line breaks and basic markdown
-        let formattedContent = content
-            .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>')
-            .replace(/\n/g, '<br>');
-        
-        contentDiv.innerHTML = formattedContent;
+        messageDiv.dataset.content = content;
+        contentDiv.innerHTML = formatMessageContent(content);
 
         // Create message actions
         const actionsDiv = document.createElement('div');
@@ -211,14 +281,14 @@ document.addEventListener('DOMContentLoaded', function() {
         copyBtn.className = 'action-btn copy-btn';
         copyBtn.innerHTML = '📋';
         copyBtn.title = 'Copy text';
-        copyBtn.addEventListener('click', () => copyToClipboard(content));
+        copyBtn.addEventListener('click', () => copyToClipboard(messageDiv.dataset.content));
         
         // Read aloud button
         const readBtn = document.createElement('button');
         readBtn.className = 'action-btn read-btn';
         readBtn.innerHTML = '🔊';
         readBtn.title = 'Read aloud';
-        readBtn.addEventListener('click', () => speakText(content));
+        readBtn.addEventListener('click', () => speakText(messageDiv.dataset.content));
         
         actionsDiv.appendChild(copyBtn);
         actionsDiv.appendChild(readBtn);
@@ -233,6 +303,7 @@ document.addEventListener('DOMContentLoaded', function() {
             top: chatMessages.scrollHeight,
             behavior: 'smooth'
         });
+        return messageDiv;
     }
 
     function addTypingIndicator() {
@@ -441,21 +512,77 @@ function initBackground() {
     // Load recent uploads
     loadRecentUploads();
     
-    // Set initial background from server session
-    // The background_settings is passed directly from Flask template
-    const bgType = '{{ background_settings.type }}';
-    const bgValue = '{{ background_settings.value }}';
-    const bgSize = '{{ background_settings.size }}';
+    // Set initial background from the server-side settings rendered onto <body>
+    const bgType = document.body.dataset.bgType;
+    const bgValue = document.body.dataset.bgValue;
+    const bgSize = document.body.dataset.bgSize;
     
-    if (bgType && bgValue) {
-        applyBackground(bgType, bgValue, bgSize);
-        updateActiveBackgroundOption(bgType, bgValue);
-    } else {
+    if (!bgType || !bgValue) {
         // Fallback to default
         applyBackground('solid', '#ffffff', '');
+    } else if (bgType !== 'image') {
+        applyBackground(bgType, bgValue, bgSize);
     }
+    
+    // Images take their (fingerprinted) URL from the option previews, so wait for those
+    loadBackgroundOptions().then(() => {
+        if (bgType === 'image' && bgValue) {
+            applyBackground(bgType, bgValue, bgSize);
+        }
+        updateActiveBackgroundOption(bgType, bgValue);
+    });
 }
 
+    async function loadBackgroundOptions() {
+        try {
+            // Served separately so browsers cache it across pages and sessions
+            const response = await fetch('/background-options');
+            const options = await response.json();
+            
+            document.querySelectorAll('.color-grid[data-options]').forEach(grid => {
+                grid.replaceChildren(...(options[grid.dataset.options] || []).map(createBackgroundOption));
+            });
+        } catch (error) {
+            console.error('Error loading background options:', error);
+        }
+    }
+
+    function createBackgroundOption(option) {
+        const element = document.createElement('div');
+        element.className = 'color-option';
+        element.dataset.type = option.type;
+        element.dataset.value = option.value;
+        element.dataset.size = option.size || '';
+        
+        const preview = document.createElement('div');
+        preview.className = 'color-preview';
+        switch(option.type) {
+            case 'solid':
+                preview.style.backgroundColor = option.value;
+                break;
+            case 'gradient':
+                preview.style.background = option.value;
+                break;
+            case 'pattern':
+                preview.classList.add('pattern-preview');
+                preview.style.background = option.value;
+                preview.style.backgroundSize = option.size || '';
+                break;
+            case 'image':
+                preview.classList.add('image-preview');
+                preview.style.backgroundImage = `url('${option.url}')`;
+                break;
+        }
+        
+        const name = document.createElement('span');
+        name.className = 'color-name';
+        name.textContent = option.name;
+        element.append(preview, name);
+        
+        element.addEventListener('click', () => setBackground(option.type, option.value, option.size || ''));
+        return element;
+    }
+
     function initBackgroundTabs() {
         const tabBtns = document.querySelectorAll('.tab-btn');
         const tabContents = document.querySelectorAll('.tab-content');
@@ -474,17 +601,6 @@ function initBackground() {
             });
         });
         
-        // Background option click handlers
-        document.querySelectorAll('.color-option[data-type]').forEach(option => {
-            option.addEventListener('click', function() {
-                const type = this.getAttribute('data-type');
-                const value = this.getAttribute('data-value');
-                const size = this.getAttribute('data-size') || '';
-                
-                setBackground(type, value, size);
-            });
-        });
-        
         // Upload area click handler
         const uploadArea = document.getElementById('uploadArea');
         const backgroundUpload = document.getElementById('backgroundUpload');
@@ -603,11 +719,15 @@ function initBackground() {
                     document.body.style.setProperty('--bg-pattern-size', size);
                 }
                 break;
-            case 'image':
-                document.body.style.setProperty('--bg-image', `url('/static/backgrounds/${value}')`);
+            case 'image': {
+                // Reuse the preview's URL, which points at the fingerprinted build when there is one
+                const preview = document.querySelector(`.color-option[data-type="image"][data-value="${value}"] .image-preview`);
+                document.body.style.setProperty('--bg-image', preview ? preview.style.backgroundImage : `url('/static/backgrounds/${value}')`);
                 break;
+            }
             case 'uploaded':
-                document.body.style.setProperty('--bg-uploaded', `url('/static/uploads/${value}')`);
+                // Ask for the resized variant that fits this screen
+                document.body.style.setProperty('--bg-uploaded', `url('/static/uploads/${value}?w=${viewportWidth()}')`);
                 break;
         }
         
@@ -620,6 +740,10 @@ function initBackground() {
         localStorage.setItem('juaHakiBackground', JSON.stringify(bgSettings));
     }
 
+    function viewportWidth() {
+        return Math.ceil(Math.max(window.screen.width, window.innerWidth) * (window.devicePixelRatio || 1));
+    }
+
     function updateActiveBackgroundOption(type, value) {
         // Remove active class from all options
         document.querySelectorAll('.color-option').forEach(opt => {
@@ -659,7 +783,7 @@ function initBackground() {
         
         recentGrid.innerHTML = recentUploads.map(filename => `
             <div class="recent-item" data-filename="${filename}">
-                <img src="/static/uploads/${filename}" alt="Recent upload" onerror="this.style.display='none'">
+                <img src="/static/uploads/${filename}?w=480" alt="Recent upload" onerror="this.style.display='none'">
             </div>
         `).join('');
         
@@ -0,0 +1,180 @@
+import hashlib
+import os
+import re
+import tempfile
+import time
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it only the original upload is served
+    Image = None
+
+IMAGE_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+}
+# Decoded formats accepted, and the extension each is stored under
+IMAGE_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+# Widths that cover common phone, tablet, laptop and large desktop viewports
+VARIANT_WIDTHS = (480, 960, 1440, 1920, 2560)
+VARIANT_QUALITY = 80
+CHUNK_SIZE = 64 * 1024
+
+CONTENT_NAME_RE = re.compile(r'^([0-9a-f]{32})(?:_w(\d+))?\.(jpg|png|gif|webp)$')
+
+
+def save_upload(file_storage, upload_dir, executor=None):
+    """Stream an upload to disk, naming it by its content hash
+
+    Returns the stored filename. Uploading the same image twice returns the
+    existing file instead of writing a duplicate. Resized variants are made
+    on `executor` if given; until they exist the original is served.
+    """
+    extension = IMAGE_EXTENSIONS.get(file_storage.mimetype)
+    if extension is None:
+        raise ValueError("Unsupported image type")
+
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=upload_dir, prefix='.upload_')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file_storage.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+
+        if Image is not None:
+            # Named after what the bytes decode as, not what the client claimed
+            extension = verify_image(tmp_path)
+        filename = f"{digest.hexdigest()[:32]}{extension}"
+        path = os.path.join(upload_dir, filename)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            touch_upload(upload_dir, filename)
+        else:
+            os.replace(tmp_path, path)
+            if executor is not None:
+                executor.submit(make_variants, upload_dir, filename)
+            else:
+                make_variants(upload_dir, filename)
+        return filename
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def verify_image(path):
+    """Check that a file is an intact image in a supported format and return its extension
+
+    Raises ValueError otherwise, including for decompression bombs.
+    """
+    try:
+        with Image.open(path) as image:
+            image_format = image.format
+            image.verify()
+    except Exception:
+        # Pillow reports corrupt data as OSError, SyntaxError or ValueError, and
+        # oversized images as DecompressionBombError
+        raise ValueError("Not a valid image")
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError("Unsupported image type")
+    return IMAGE_FORMATS[image_format]
+
+
+def variant_name(filename, width):
+    base, extension = os.path.splitext(filename)
+    # Photos are recompressed as JPEG; PNG/GIF keep their format for transparency
+    if extension in ('.jpg', '.webp'):
+        extension = '.jpg'
+    return f"{base}_w{width}{extension}"
+
+
+def make_variants(upload_dir, filename):
+    """Write downscaled, recompressed copies for each variant width narrower than the original"""
+    if Image is None or filename.endswith('.gif'):
+        return []
+
+    created = []
+    try:
+        with Image.open(os.path.join(upload_dir, filename)) as image:
+            for width in VARIANT_WIDTHS:
+                if width >= image.width:
+                    break
+                height = round(image.height * width / image.width)
+                resized = image.resize((width, height), Image.LANCZOS)
+                name = variant_name(filename, width)
+                # Written under a temporary name so best_variant never picks up a partial file
+                tmp_path = os.path.join(upload_dir, f".variant_{name}")
+                if name.endswith('.jpg'):
+                    resized.convert('RGB').save(tmp_path, 'JPEG', quality=VARIANT_QUALITY, optimize=True,
+                                                progressive=True)
+                else:
+                    resized.save(tmp_path, os.path.splitext(name)[1][1:].upper(), optimize=True)
+                os.replace(tmp_path, os.path.join(upload_dir, name))
+                created.append(name)
+    except Exception:
+        # Variants are an optimization; without them the original is served
+        pass
+    return created
+
+
+def best_variant(upload_dir, filename, width):
+    """Return the smallest stored variant at least `width` pixels wide, or the original"""
+    if not CONTENT_NAME_RE.match(filename):
+        return filename
+    for variant_width in VARIANT_WIDTHS:
+        if variant_width >= width:
+            name = variant_name(filename, variant_width)
+            if os.path.exists(os.path.join(upload_dir, name)):
+                return name
+            break
+    return filename
+
+
+def content_hash(filename):
+    """Return the content hash for content-addressed names, or None for legacy uploads"""
+    match = CONTENT_NAME_RE.match(filename)
+    return match.group(1) if match else None
+
+
+def touch_upload(upload_dir, filename):
+    """Record that a session still references an upload"""
+    if not CONTENT_NAME_RE.match(filename or ''):
+        return
+    path = os.path.join(upload_dir, filename)
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def cleanup_uploads(upload_dir, max_age):
+    """Delete uploads (and their variants) that no session has referenced for max_age seconds"""
+    cutoff = time.time() - max_age
+    removed = []
+    for name in os.listdir(upload_dir):
+        path = os.path.join(upload_dir, name)
+        match = CONTENT_NAME_RE.match(name)
+        # Only content-addressed originals and abandoned temp files are managed here;
+        # variants live and die with their original
+        if not (match and not match.group(2)) and not name.startswith(('.upload_', '.variant_')):
+            continue
+        try:
+            if os.path.getmtime(path) >= cutoff:
+                continue
+            os.remove(path)
+        except OSError:
+            continue
+        removed.append(name)
+        if match:
+            for width in VARIANT_WIDTHS:
+                try:
+                    os.remove(os.path.join(upload_dir, variant_name(name, width)))
+                except OSError:
+                    pass
+    return removed
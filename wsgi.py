@@ -0,0 +1,12 @@
+"""WSGI entry point for production servers:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import os
+
+# Several worker processes must share caches and conversations rather than each keeping its own
+os.environ.setdefault('STATE_BACKEND', 'sqlite')
+# One journal file per worker slot, so appends and rotation never interleave
+os.environ.setdefault('JOURNAL_FILE', os.path.join('journal', 'requests-{worker}.jsonl'))
+
+from app import app  # noqa: E402